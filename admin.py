@@ -0,0 +1,383 @@
+"""Admin area: programs, users, contact messages, registrations, exports and imports"""
+import io
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, url_for, session, flash, Response, stream_with_context
+from werkzeug.security import check_password_hash
+
+from models import db, User, Program, Contact, Registration, ProgramRegistration, SessionRegistration
+from image_pipeline import set_program_photo
+from pagination import keyset_paginate
+from exports import EXPORTS, stream_csv
+from registration_import import KINDS as IMPORT_KINDS, import_csv
+from booking import promote_waitlist
+from extensions import outbox, page_cache
+import contact_search
+import emails
+import stats
+
+bp = Blueprint('admin', __name__)
+
+
+@bp.route('/admin/login', methods=['GET', 'POST'])
+def admin_login():
+    if request.method == 'POST':
+        email = request.form.get('email')
+        password = request.form.get('password')
+
+        user = User.query.filter_by(email=email, is_admin=True).first()
+        if user and check_password_hash(user.password_hash, password):
+            session['admin_id'] = user.id
+            session['is_admin'] = True
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            flash('Invalid credentials', 'error')
+
+    return render_template('admin/login.html')
+
+@bp.route('/admin/logout')
+def admin_logout():
+    session.pop('admin_id', None)
+    session.pop('is_admin', None)
+    return redirect(url_for('admin.admin_login'))
+
+@bp.route('/admin/dashboard')
+def admin_dashboard():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    # Stat tiles come from the pre-aggregated counters (see stats.py); the
+    # program table is small and edited by admins, so it is counted directly
+    totals, signups_by_day = stats.dashboard_stats(days=14)
+    totals['programs'] = db.session.query(db.func.count(Program.id)).scalar()
+    max_signups = max([count for day, count in signups_by_day] + [1])
+    contacts = Contact.query.order_by(Contact.created_at.desc()).limit(10).all()
+    # The template shows reg.user.name and reg.program.name - join them in up front
+    registrations = Registration.query.options(
+        db.joinedload(Registration.user),
+        db.joinedload(Registration.program)
+    ).order_by(Registration.created_at.desc()).limit(10).all()
+    program_registrations = ProgramRegistration.query.order_by(ProgramRegistration.created_at.desc()).limit(10).all()
+    session_registrations = SessionRegistration.query.order_by(SessionRegistration.created_at.desc()).limit(10).all()
+
+    return render_template('admin/dashboard.html', 
+                         totals=totals, 
+                         signups_by_day=signups_by_day,
+                         max_signups=max_signups,
+                         contacts=contacts,
+                         registrations=registrations,
+                         program_registrations=program_registrations,
+                         session_registrations=session_registrations)
+
+@bp.route('/admin/programs', methods=['GET', 'POST'])
+def admin_programs():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    if request.method == 'POST':
+        name = request.form.get('name')
+        type = request.form.get('type')
+        time_str = request.form.get('time', '')
+        start_time_str = request.form.get('start_time', '')
+        end_time_str = request.form.get('end_time', '')
+        date = datetime.strptime(request.form.get('date'), '%Y-%m-%d').date()
+        description = request.form.get('description')
+        status = request.form.get('status', 'active')
+        category = request.form.get('category')
+        capacity = request.form.get('capacity', type=int)
+
+        # Parse start_time and end_time
+        start_time = None
+        end_time = None
+        if start_time_str:
+            try:
+                start_time = datetime.strptime(start_time_str, '%H:%M').time()
+            except:
+                pass
+        if end_time_str:
+            try:
+                end_time = datetime.strptime(end_time_str, '%H:%M').time()
+            except:
+                pass
+
+        # If time pickers are used, format time string
+        if start_time and end_time:
+            time_str = f"{start_time.strftime('%I:%M %p')} - {end_time.strftime('%I:%M %p')}"
+        elif not time_str and start_time:
+            time_str = start_time.strftime('%I:%M %p')
+
+        program = Program(
+            name=name, type=type, time=time_str, date=date,
+            description=description, status=status, category=category,
+            start_time=start_time, end_time=end_time, capacity=capacity
+        )
+
+        # Handle image upload as BLOB (resized variants are generated here)
+        if 'photo' in request.files:
+            file = request.files['photo']
+            if file.filename:
+                set_program_photo(program, file.read(), file.filename, file.content_type)
+
+        db.session.add(program)
+        db.session.commit()
+        page_cache.invalidate()
+        flash('Program created successfully!', 'success')
+        return redirect(url_for('admin.admin_programs'))
+
+    programs = Program.query.order_by(Program.created_at.desc()).all()
+    return render_template('admin/programs.html', programs=programs)
+
+@bp.route('/admin/programs/<int:id>/edit', methods=['GET', 'POST'])
+def admin_edit_program(id):
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    program = Program.query.get_or_404(id)
+
+    if request.method == 'POST':
+        program.name = request.form.get('name')
+        program.type = request.form.get('type')
+        time_str = request.form.get('time', '')
+        start_time_str = request.form.get('start_time', '')
+        end_time_str = request.form.get('end_time', '')
+        program.date = datetime.strptime(request.form.get('date'), '%Y-%m-%d').date()
+        program.description = request.form.get('description')
+        program.status = request.form.get('status', 'active')
+        program.category = request.form.get('category')
+        program.capacity = request.form.get('capacity', type=int)
+
+        # Parse start_time and end_time
+        start_time = None
+        end_time = None
+        if start_time_str:
+            try:
+                start_time = datetime.strptime(start_time_str, '%H:%M').time()
+            except:
+                pass
+        if end_time_str:
+            try:
+                end_time = datetime.strptime(end_time_str, '%H:%M').time()
+            except:
+                pass
+
+        # If time pickers are used, format time string
+        if start_time and end_time:
+            time_str = f"{start_time.strftime('%I:%M %p')} - {end_time.strftime('%I:%M %p')}"
+        elif not time_str and start_time:
+            time_str = start_time.strftime('%I:%M %p')
+
+        program.time = time_str
+        program.start_time = start_time
+        program.end_time = end_time
+
+        # Handle image upload as BLOB (resized variants are generated here)
+        if 'photo' in request.files:
+            file = request.files['photo']
+            if file.filename:
+                set_program_photo(program, file.read(), file.filename, file.content_type)
+
+        # A raised capacity gives seats to the waitlist, oldest first
+        promoted = promote_waitlist(program)
+        db.session.commit()
+        page_cache.invalidate()
+        for booking in promoted:
+            try:
+                outbox.send(emails.seat_confirmed_message(booking, program))
+            except Exception:
+                current_app.logger.exception("Could not queue email")
+        if promoted:
+            flash(f'{len(promoted)} waitlisted registration(s) confirmed.', 'success')
+        flash('Program updated successfully!', 'success')
+        return redirect(url_for('admin.admin_programs'))
+
+    return render_template('admin/edit_program.html', program=program)
+
+@bp.route('/admin/programs/<int:id>/delete', methods=['POST'])
+def admin_delete_program(id):
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    program = Program.query.get_or_404(id)
+    db.session.delete(program)
+    db.session.commit()
+    page_cache.invalidate()
+    flash('Program deleted successfully!', 'success')
+    return redirect(url_for('admin.admin_programs'))
+
+@bp.route('/admin/users')
+def admin_users():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    page = keyset_paginate(User.query, User, current_app.config['ADMIN_PAGE_SIZE'])
+    total_users = db.session.query(db.func.count(User.id)).scalar()
+    return render_template('admin/users.html', users=page.items, page=page, total_users=total_users)
+
+@bp.route('/admin/contacts')
+def admin_contacts():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    search_query = request.args.get('search', '').strip()
+    per_page = current_app.config['ADMIN_PAGE_SIZE']
+    matches = {}
+    if search_query:
+        # Ranked full-text matches, with the matched words marked in the name and a message snippet
+        page = contact_search.search(search_query, per_page)
+        contacts = [contact for contact, name, snippet in page.items]
+        matches = {contact.id: (name, snippet) for contact, name, snippet in page.items}
+    else:
+        page = keyset_paginate(Contact.query, Contact, per_page)
+        contacts = page.items
+    total_contacts = db.session.query(db.func.count(Contact.id)).scalar()
+    return render_template('admin/contacts.html', contacts=contacts, matches=matches, page=page,
+                           total_contacts=total_contacts, search_query=search_query)
+
+@bp.route('/admin/contacts/<int:id>/reply', methods=['POST'])
+def admin_reply_contact(id):
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    contact = Contact.query.get_or_404(id)
+
+    email = request.form.get('email')
+    subject = request.form.get('subject')
+    message = request.form.get('message')
+
+    try:
+        msg = emails.message(
+            subject=subject,
+            recipients=[email],
+            body=message
+        )
+        if outbox.send(msg):
+            flash(f'Reply to {email} queued for sending', 'success')
+        else:
+            flash('Failed to send reply: no recipient email address', 'error')
+    except Exception as e:
+        flash(f'Failed to send reply: {str(e)}', 'error')
+
+    return redirect(url_for('admin.admin_contacts'))
+
+@bp.route('/admin/contacts/<int:id>/delete', methods=['POST'])
+def admin_delete_contact(id):
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    contact = Contact.query.get_or_404(id)
+    db.session.delete(contact)
+    db.session.commit()
+    flash('Contact message deleted successfully!', 'success')
+    return redirect(url_for('admin.admin_contacts'))
+
+@bp.route('/admin/program-registrations')
+def admin_program_registrations():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    # Per-program counts come from the database; rows are only loaded for the
+    # program the admin expanded, one page at a time
+    groups = db.session.query(
+        ProgramRegistration.program_name,
+        db.func.count(ProgramRegistration.id).label('count'),
+        db.func.max(ProgramRegistration.created_at).label('latest')
+    ).group_by(ProgramRegistration.program_name).order_by(db.desc('latest')).all()
+    total_registrations = sum(group.count for group in groups)
+
+    selected_program = request.args.get('program')
+    page = None
+    if selected_program is not None:
+        page = keyset_paginate(
+            ProgramRegistration.query.filter_by(program_name=selected_program),
+            ProgramRegistration, current_app.config['ADMIN_PAGE_SIZE']
+        )
+
+    return render_template('admin/program_registrations.html', 
+                         groups=groups,
+                         total_registrations=total_registrations,
+                         selected_program=selected_program,
+                         page=page)
+
+@bp.route('/admin/session-registrations')
+def admin_session_registrations():
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    # Per-session counts come from the database; rows are only loaded for the
+    # session the admin expanded, one page at a time
+    groups = db.session.query(
+        SessionRegistration.session_id,
+        db.func.max(SessionRegistration.session_name).label('session_name'),
+        db.func.count(SessionRegistration.id).label('count'),
+        db.func.max(SessionRegistration.created_at).label('latest')
+    ).group_by(SessionRegistration.session_id).order_by(db.desc('latest')).all()
+    total_registrations = sum(group.count for group in groups)
+
+    selected_session = request.args.get('session_id', type=int)
+    page = None
+    if selected_session is not None:
+        page = keyset_paginate(
+            SessionRegistration.query.filter_by(session_id=selected_session),
+            SessionRegistration, current_app.config['ADMIN_PAGE_SIZE']
+        )
+
+    return render_template('admin/session_registrations.html', 
+                         groups=groups,
+                         total_registrations=total_registrations,
+                         selected_session=selected_session,
+                         page=page)
+
+@bp.route('/admin/export/<kind>.csv')
+def admin_export_csv(kind):
+    """Stream registrations as CSV, optionally filtered by program/session and ?from=/?to= dates"""
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+    if kind not in EXPORTS:
+        return jsonify({'error': 'Unknown export'}), 404
+
+    try:
+        header, stmt = EXPORTS[kind](request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid filter, dates must be YYYY-MM-DD'}), 400
+
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.csv"
+    return Response(
+        stream_with_context(stream_csv(header, stmt)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/admin/import', methods=['GET', 'POST'])
+def admin_import_registrations():
+    """Bulk-import registrations from an uploaded CSV, as a dry run unless the box is unticked"""
+    if not session.get('is_admin'):
+        return redirect(url_for('admin.admin_login'))
+
+    report = None
+    error = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        kind = request.form.get('kind', 'program')
+        dry_run = bool(request.form.get('dry_run'))
+        if not upload or not upload.filename:
+            error = 'Choose a CSV file to import'
+        elif kind not in IMPORT_KINDS:
+            error = 'Unknown import type'
+        else:
+            # Read the upload as it is parsed instead of decoding it in one go
+            lines = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+            try:
+                report = import_csv(lines, kind, program=request.form.get('program', '').strip(),
+                                    session_id=request.form.get('session_id', type=int), dry_run=dry_run)
+            except UnicodeDecodeError:
+                db.session.rollback()
+                error = 'The file is not UTF-8 encoded CSV (in Excel, save as "CSV UTF-8")'
+            except ValueError as exc:
+                error = str(exc)
+            else:
+                current_app.logger.info("Registrations imported", extra={
+                    key: value for key, value in report.as_dict().items() if key not in ('errors', 'per_target')})
+
+    sessions = db.session.query(Program.id, Program.name, Program.date).order_by(Program.date.desc()).all()
+    return render_template('admin/import.html', report=report, error=error, sessions=sessions,
+                           form=request.form)
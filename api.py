@@ -0,0 +1,161 @@
+"""
+Versioned JSON API for the homepage and mobile clients.
+
+    GET /api/v1/programs                              active programs, latest date first
+    GET /api/v1/sessions/<id>/registrations           bookings for a program (admin only)
+
+Both take ?fields=a,b,c to return only some fields (and only load those
+columns), ?limit= (at most MAX_LIMIT) and the ?before= cursor from the
+previous response's "next" link. Responses carry an ETag, so clients
+polling with If-None-Match get an empty 304 while nothing has changed.
+
+Registrations contain personal data: they need an admin session or an
+`Authorization: Bearer <API_TOKEN>` header.
+
+Bodies are serialized with orjson when it is installed (several times
+faster than the json module for lists of rows), or compact json otherwise.
+"""
+import hmac
+import json
+
+from flask import Blueprint, current_app, request, session, url_for, Response
+
+from models import db, Program, SessionRegistration
+from pagination import keyset_paginate
+
+try:
+    import orjson
+except ImportError:  # Optional: `pip install orjson`
+    orjson = None
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def _hhmm(value):
+    return value.strftime('%H:%M') if value else None
+
+
+def _image(program):
+    if not program.photo_size:
+        return None
+    return url_for('public.serve_program_image', program_id=program.id, size='card', v=program.photo_hash)
+
+
+# Field name -> (columns it needs, value of the field for a row)
+PROGRAM_FIELDS = {
+    'id': (('id',), lambda p: p.id),
+    'name': (('name',), lambda p: p.name),
+    'type': (('type',), lambda p: p.type),
+    'category': (('category',), lambda p: p.category),
+    'date': (('date',), lambda p: p.date.isoformat()),
+    'time': (('time',), lambda p: p.time),
+    'start_time': (('start_time',), lambda p: _hhmm(p.start_time)),
+    'end_time': (('end_time',), lambda p: _hhmm(p.end_time)),
+    'description': (('description',), lambda p: p.description),
+    'capacity': (('capacity',), lambda p: p.capacity),
+    'seats_left': (('capacity', 'seats_taken'), lambda p: p.seats_left()),
+    'image': (('photo_size', 'photo_hash'), _image),
+}
+PROGRAM_DEFAULT_FIELDS = ('id', 'name', 'type', 'category', 'date', 'time', 'seats_left', 'image')
+
+REGISTRATION_FIELDS = {
+    'id': (('id',), lambda r: r.id),
+    'name': (('name',), lambda r: r.name),
+    'email': (('email',), lambda r: r.email),
+    'phone': (('phone',), lambda r: r.phone),
+    'status': (('status',), lambda r: r.status),
+    'session_name': (('session_name',), lambda r: r.session_name),
+    'created_at': (('created_at',), lambda r: r.created_at.isoformat() if r.created_at else None),
+}
+REGISTRATION_DEFAULT_FIELDS = ('id', 'name', 'email', 'phone', 'status', 'created_at')
+
+
+def json_response(payload, status=200):
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+    return Response(body, status=status, mimetype='application/json')
+
+
+def _error(message, status, **extra):
+    return json_response({'error': message, **extra}, status)
+
+
+def _selected_fields(available, default):
+    """Fields named in ?fields=, or None if one of them does not exist"""
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()]
+    names = list(dict.fromkeys(names)) or list(default)
+    if any(name not in available for name in names):
+        return None
+    return names
+
+
+def _limit():
+    return max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+
+
+def _page(query, model, fields, available, order_column=None):
+    """Load one page with only the columns the fields need and serialize it"""
+    columns = {'id', 'created_at' if order_column is None else order_column.key}
+    for name in fields:
+        columns.update(available[name][0])
+    query = query.options(db.load_only(*(getattr(model, column) for column in columns)))
+    page = keyset_paginate(query, model, _limit(), order_column=order_column)
+    return {
+        'data': [{name: available[name][1](row) for name in fields} for row in page.items],
+        'next_cursor': page.next_cursor,
+        'next': page.next_url,
+    }
+
+
+def _conditional(response):
+    """Answer If-None-Match with a 304 when the body has not changed"""
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.route('/programs')
+def programs():
+    fields = _selected_fields(PROGRAM_FIELDS, PROGRAM_DEFAULT_FIELDS)
+    if fields is None:
+        return _error('Unknown field', 400, fields=sorted(PROGRAM_FIELDS))
+
+    query = Program.query.filter_by(status='active')
+    for column in ('type', 'category'):
+        if request.args.get(column):
+            query = query.filter(getattr(Program, column) == request.args[column])
+    return _conditional(json_response(_page(query, Program, fields, PROGRAM_FIELDS, order_column=Program.date)))
+
+
+def _authorized():
+    if session.get('is_admin'):
+        return True
+    token = current_app.config.get('API_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+
+@bp.route('/sessions/<int:session_id>/registrations')
+def session_registrations(session_id):
+    if not _authorized():
+        return _error('Authentication required', 401)
+    if db.session.get(Program, session_id) is None:
+        return _error('Session not found', 404)
+    fields = _selected_fields(REGISTRATION_FIELDS, REGISTRATION_DEFAULT_FIELDS)
+    if fields is None:
+        return _error('Unknown field', 400, fields=sorted(REGISTRATION_FIELDS))
+
+    query = SessionRegistration.query.filter_by(session_id=session_id)
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    payload = _page(query, SessionRegistration, fields, REGISTRATION_FIELDS)
+
+    # Seat counts for the whole session, from the (session_id, created_at) index
+    counts = db.session.query(SessionRegistration.status, db.func.count(SessionRegistration.id)).filter_by(
+        session_id=session_id).group_by(SessionRegistration.status).all()
+    payload['counts'] = dict(counts)
+    return _conditional(json_response(payload))
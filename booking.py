@@ -0,0 +1,98 @@
+"""
+Seat reservation for programs with a limited capacity.
+
+Program.seats_taken counts confirmed bookings (session registrations from
+the homepage modal and account registrations alike). A booking takes a
+seat with one conditional UPDATE, so the capacity check and the increment
+happen atomically in the database:
+
+* PostgreSQL row-locks the program until the booking commits, so a second
+  booking for the same program waits and then re-checks the capacity.
+* SQLite takes its database write lock on that UPDATE. It is the first
+  write of the booking transaction, which makes it behave like
+  BEGIN IMMEDIATE without changing how the rest of the app opens
+  transactions.
+
+When the program is full the booking is stored with status 'waitlisted'
+instead, and promote_waitlist() confirms waitlisted bookings in arrival
+order when the admin raises the capacity.
+"""
+from models import db, Program, Registration, SessionRegistration
+
+CONFIRMED = 'confirmed'
+WAITLISTED = 'waitlisted'
+
+
+def reserve_seat(program_id):
+    """Take a seat on the program in the current transaction (the caller commits).
+
+    Returns True if a seat was reserved, False if the program is full.
+    """
+    result = db.session.execute(
+        db.update(Program)
+        .where(
+            Program.id == program_id,
+            db.or_(Program.capacity.is_(None), Program.seats_taken < Program.capacity)
+        )
+        .values(seats_taken=Program.seats_taken + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve_seats(program_id, count):
+    """Take up to count seats on the program in the current transaction (the caller commits).
+
+    Used for bulk imports. Returns how many seats were reserved; the other
+    bookings are waitlisted. The UPDATE only applies if seats_taken has not
+    moved since it was read (PostgreSQL holds the row lock anyway), and is
+    retried otherwise.
+    """
+    while True:
+        capacity, taken = db.session.execute(
+            db.select(Program.capacity, Program.seats_taken).where(Program.id == program_id).with_for_update()
+        ).one()
+        reserved = count if capacity is None else max(0, min(count, capacity - taken))
+        if reserved == 0:
+            return 0
+        result = db.session.execute(
+            db.update(Program)
+            .where(Program.id == program_id, Program.seats_taken == taken)
+            .values(seats_taken=Program.seats_taken + reserved)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return reserved
+
+
+def booking_status(program_id):
+    """Reserve a seat if possible and return the status for the new booking"""
+    return CONFIRMED if reserve_seat(program_id) else WAITLISTED
+
+
+def promote_waitlist(program):
+    """Confirm waitlisted bookings for program while seats are free (the caller commits).
+
+    Returns the promoted SessionRegistration/Registration rows.
+    """
+    db.session.flush()
+    free = None if program.capacity is None else program.capacity - program.seats_taken
+    if free is not None and free <= 0:
+        return []
+
+    waiting = []
+    for model, column in ((SessionRegistration, SessionRegistration.session_id),
+                          (Registration, Registration.program_id)):
+        query = model.query.filter(column == program.id, model.status == WAITLISTED).order_by(
+            model.created_at, model.id)
+        if free is not None:
+            query = query.limit(free)
+        waiting.extend(query.all())
+
+    waiting.sort(key=lambda booking: booking.created_at)
+    promoted = waiting if free is None else waiting[:free]
+    for booking in promoted:
+        if reserve_seat(program.id):
+            booking.status = CONFIRMED
+    db.session.refresh(program)
+    return [booking for booking in promoted if booking.status == CONFIRMED]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Write the fingerprinted, minified and precompressed copies of the static
+files, the resized image variants and the video posters and renditions
+to static/dist/ (see static_assets.py, static_images.py and
+static_video.py). Run it as part of the build, and
+again after changing CSS, JavaScript or images.
+"""
+import os
+
+from static_assets import build, brotli, rjsmin
+import static_images
+import static_video
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+
+def size(path):
+    return os.path.getsize(os.path.join(STATIC_FOLDER, path))
+
+
+if __name__ == '__main__':
+    manifest = build(STATIC_FOLDER)
+    for source, entry in sorted(manifest['assets'].items()):
+        if entry['encodings']:
+            compressed = ', '.join(f"{size(entry['path'] + suffix)} {suffix[1:]}"
+                                   for suffix in ('.br', '.gz')
+                                   if os.path.exists(os.path.join(STATIC_FOLDER, entry['path'] + suffix)))
+            print(f"{source}: {size(source)} -> {size(entry['path'])} bytes ({compressed})")
+        elif entry.get('variants'):
+            widths = [width for width, path in entry['variants'][entry['fallback']]]
+            smallest = min(size(path) for variants in entry['variants'].values() for width, path in variants)
+            print(f"{source}: {size(source)} bytes -> {', '.join(entry['variants'])} at {widths}px "
+                  f"(smallest {smallest} bytes)")
+    print(f"{len(manifest['assets'])} files written to static/dist/")
+    if brotli is None:
+        print("brotli is not installed, only gzip copies were written (pip install brotli)")
+    if not static_images.available():
+        print("Pillow is not installed, no image variants were written")
+    if not static_video.available():
+        print("ffmpeg is not installed, no video poster or small rendition was written")
+    if rjsmin is None:
+        print("rjsmin is not installed, JavaScript was not minified (pip install rjsmin)")
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Generate resized image variants for programs uploaded before the image pipeline existed.
+Safe to run repeatedly - programs that already have variants are skipped.
+"""
+
+from app import app, page_cache, set_program_photo
+from models import db, Program
+
+if __name__ == '__main__':
+    with app.app_context():
+        programs = Program.query.filter(Program.photo_size > 0).all()
+        built = 0
+        for program in programs:
+            if program.images:
+                continue
+            print(f"Processing {program.name}...")
+            set_program_photo(program, program.photo_data, program.photo_filename or 'photo', program.photo_mime_type)
+            db.session.commit()
+            if program.images:
+                built += 1
+        if built:
+            page_cache.invalidate()
+        print(f"Image variants built for {built} program(s)")
@@ -0,0 +1,186 @@
+"""
+Response compression as WSGI middleware.
+
+Text responses (HTML, JSON, CSS, JavaScript, CSV, SVG) of at least
+COMPRESSION_MIN_SIZE bytes are compressed with brotli when the client
+accepts it and the brotli package is installed, and with gzip otherwise.
+Images, video and anything that already has a Content-Encoding (the
+precompressed static files, see static_assets.py) pass through untouched,
+as do partial (206), 304, HEAD and Cache-Control: no-transform responses.
+
+Responses with a Content-Length are compressed in one piece and get the
+new length. Streamed responses without one (the CSV exports) are
+compressed chunk by chunk, flushing after each chunk so the client keeps
+receiving data as it is produced.
+
+A compressed response's ETag is made weak (W/"...") because its bytes
+differ from the uncompressed body; Werkzeug compares If-None-Match weakly,
+so 304s keep working. Input and output byte counts go to
+RequestMetrics.record_compression() for the compression ratio on /metrics.
+"""
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # Installed from requirements.txt; without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/javascript', 'application/json', 'application/ld+json', 'application/manifest+json',
+    'application/xml', 'image/svg+xml',
+}
+NEVER_COMPRESS_TYPES = {'text/event-stream'}
+SKIP_STATUSES = (204, 206, 304)
+
+
+def _mimetype(headers):
+    return headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def _compressible(mimetype):
+    if mimetype in NEVER_COMPRESS_TYPES:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, min_size=1024, gzip_level=6, brotli_quality=5, on_compressed=None):
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.on_compressed = on_compressed  # Called with (encoding, mimetype, bytes in, bytes out)
+
+    def _encoding(self, environ):
+        """The encoding to use for this client, or None"""
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        accepted = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compressor(self, encoding):
+        return _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.gzip_level)
+
+    def _should_compress(self, status, headers):
+        if int(status.split(' ', 1)[0]) in SKIP_STATUSES:
+            return False
+        if 'Content-Encoding' in headers or 'Content-Range' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        if not _compressible(_mimetype(headers)):
+            return False
+        length = headers.get('Content-Length')
+        return length is None or int(length) >= self.min_size
+
+    def __call__(self, environ, start_response):
+        encoding = self._encoding(environ)
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+
+        # mode is 'passthrough', 'buffer' or 'stream', decided from the response headers
+        state = {'mode': None, 'returned': False, 'written': []}
+
+        def capture(status, response_headers, exc_info=None):
+            headers = Headers(response_headers)
+            # Headers that only arrive while the body is iterated are too late to change
+            if state['returned'] or not self._should_compress(status, headers):
+                state['mode'] = 'passthrough'
+                return start_response(status, response_headers, exc_info)
+
+            headers['Content-Encoding'] = encoding
+            vary = headers.get('Vary')
+            if not vary:
+                headers['Vary'] = 'Accept-Encoding'
+            elif 'accept-encoding' not in vary.lower():
+                headers['Vary'] = f'{vary}, Accept-Encoding'
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f'W/{etag}'
+            state.update(status=status, headers=headers, exc_info=exc_info)
+
+            if 'Content-Length' in headers:
+                state['mode'] = 'buffer'  # start_response is called once the body is compressed
+                return state['written'].append
+            del headers['Content-Length']
+            state['mode'] = 'stream'
+            return start_response(status, headers.to_wsgi_list(), exc_info)
+
+        body = self.wsgi_app(environ, capture)
+        state['returned'] = True
+        if state['mode'] == 'buffer':
+            return self._compress_buffered(body, encoding, state, start_response)
+        if state['mode'] == 'stream':
+            return self._compress_stream(body, encoding, state['headers'])
+        return body
+
+    def _compress_buffered(self, body, encoding, state, start_response):
+        try:
+            data = b''.join(state['written'] + list(body))
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        compressor = self._compressor(encoding)
+        compressed = compressor.compress(data) + compressor.finish()
+
+        headers = state['headers']
+        headers['Content-Length'] = str(len(compressed))
+        start_response(state['status'], headers.to_wsgi_list(), state['exc_info'])
+        if self.on_compressed:
+            self.on_compressed(encoding, _mimetype(headers), len(data), len(compressed))
+        return [compressed]
+
+    def _compress_stream(self, body, encoding, headers):
+        compressor = self._compressor(encoding)
+        size_in = size_out = 0
+        try:
+            for chunk in body:
+                if not chunk:
+                    continue
+                size_in += len(chunk)
+                data = compressor.compress(chunk) + compressor.flush()
+                size_out += len(data)
+                yield data
+            data = compressor.finish()
+            size_out += len(data)
+            yield data
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            if self.on_compressed and size_in:
+                self.on_compressed(encoding, _mimetype(headers), size_in, size_out)
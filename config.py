@@ -0,0 +1,130 @@
+"""
+Application configuration, read from the environment (and .env in development).
+
+create_app() starts from load_config() and then applies the overrides it
+was given, e.g. create_app({'TESTING': True, 'PAGE_CACHE_ENABLED': False}).
+"""
+import os
+
+from dotenv import load_dotenv
+
+
+def _flag(name, default):
+    return os.environ.get(name, default).lower() == 'true'
+
+
+def database_uri(database_url):
+    """DATABASE_URL as SQLAlchemy expects it, with postgresql:// URLs using the psycopg 3 driver"""
+    if database_url and database_url.startswith('postgresql://'):
+        return database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
+    return database_url
+
+
+def engine_options(database_url):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL, sized so all workers fit in DB_MAX_CONNECTIONS.
+
+    Each gunicorn worker (WEB_CONCURRENCY) keeps its own pool with a
+    connection per request thread (GUNICORN_THREADS) plus one for the mail
+    outbox thread, and may overflow up to its share of DB_MAX_CONNECTIONS.
+    DB_POOL_SIZE/DB_MAX_OVERFLOW override the derived sizes.
+
+    psycopg prepares a statement on the server once it has run
+    DB_PREPARE_THRESHOLD times on a connection. DB_PGBOUNCER=true turns
+    that off (a transaction-mode PgBouncer hands each transaction to any
+    server connection, where the prepared statement may not exist) and
+    drops the statement_timeout startup option, which PgBouncer rejects;
+    set it on the database role instead.
+    """
+    if not database_url or not database_url.startswith('postgresql'):
+        return {}
+
+    workers = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+    threads = max(1, int(os.environ.get('GUNICORN_THREADS', 1)))
+    per_worker = max(1, int(os.environ.get('DB_MAX_CONNECTIONS', 20)) // workers)
+    pool_size = int(os.environ.get('DB_POOL_SIZE') or min(threads + 1, per_worker))
+    max_overflow = int(os.environ.get('DB_MAX_OVERFLOW') or max(0, per_worker - pool_size))
+
+    connect_args = {
+        'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 10)),
+        'application_name': os.environ.get('DB_APPLICATION_NAME', 'nirvana-buddha-web'),
+    }
+    if _flag('DB_PGBOUNCER', 'False'):
+        connect_args['prepare_threshold'] = None
+    else:
+        connect_args['prepare_threshold'] = int(os.environ.get('DB_PREPARE_THRESHOLD', 5))
+        connect_args['options'] = f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))}"
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # Seconds to wait for a free connection
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # Reconnect after this many seconds
+        'pool_pre_ping': True,  # Replace connections the server or a proxy closed while idle
+        'pool_use_lifo': True,  # Reuse warm connections so spare ones can idle out
+        'connect_args': connect_args,
+    }
+
+
+def load_config():
+    """Settings for a new app, read from the environment at call time"""
+    load_dotenv()
+
+    database_url = database_uri(os.environ.get('DATABASE_URL'))
+
+    return {
+        # Production-ready configuration
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-secret-key'),
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(database_url),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'UPLOAD_FOLDER': 'static/uploads',
+        'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB max file size
+
+        # Email configuration
+        'MAIL_SERVER': os.environ.get('MAIL_SERVER', 'smtp.gmail.com'),
+        'MAIL_PORT': int(os.environ.get('MAIL_PORT', 587)),
+        'MAIL_USE_TLS': _flag('MAIL_USE_TLS', 'True'),
+        'MAIL_USERNAME': os.environ.get('MAIL_USERNAME', ''),
+        'MAIL_PASSWORD': os.environ.get('MAIL_PASSWORD', ''),
+        'MAIL_DEFAULT_SENDER': os.environ.get('MAIL_USERNAME', ''),
+        # 'thread' delivers queued email from a background thread in each app process,
+        # 'external' leaves it to a separate `python mail_worker.py` process
+        'MAIL_OUTBOX_WORKER': os.environ.get('MAIL_OUTBOX_WORKER', 'thread'),
+
+        # Rendered page cache for the public pages ('memory' per worker, or 'file' shared on disk)
+        'PAGE_CACHE_ENABLED': _flag('PAGE_CACHE_ENABLED', 'True'),
+        'PAGE_CACHE_BACKEND': os.environ.get('PAGE_CACHE_BACKEND', 'memory'),
+        'PAGE_CACHE_TTL': int(os.environ.get('PAGE_CACHE_TTL', 300)),
+        'PAGE_CACHE_MAX_ENTRIES': int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 128)),
+
+        # Serve the content-hashed copies written by build_assets.py, if they exist
+        'STATIC_ASSETS_FINGERPRINT': _flag('STATIC_ASSETS_FINGERPRINT', 'True'),
+
+        # gzip/brotli compression of text responses (compression.py)
+        'COMPRESSION_ENABLED': _flag('COMPRESSION_ENABLED', 'True'),
+        'COMPRESSION_MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),  # Bytes
+        'COMPRESSION_GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+        'COMPRESSION_BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5)),
+
+        # Rows per page on the admin list pages
+        'ADMIN_PAGE_SIZE': int(os.environ.get('ADMIN_PAGE_SIZE', 50)),
+
+        # Bearer token that lets API clients read registrations without an admin session
+        'API_TOKEN': os.environ.get('API_TOKEN'),
+
+        # Structured logging: JSON lines (or LOG_FORMAT=text) written from a background thread
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO').upper(),
+        'LOG_FORMAT': os.environ.get('LOG_FORMAT', 'json'),
+        'LOG_FILE': os.environ.get('LOG_FILE'),  # Default: stdout
+        'LOG_SAMPLE_RATE': float(os.environ.get('LOG_SAMPLE_RATE', 1.0)),  # Share of high-volume info logs kept
+
+        # Per-request timing/SQL metrics at /metrics, optional Server-Timing headers and sampled profiling
+        'METRICS_ENABLED': _flag('METRICS_ENABLED', 'False'),
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),  # Bearer token required by /metrics if set
+        'METRICS_SERVER_TIMING': _flag('METRICS_SERVER_TIMING', 'False'),
+        'METRICS_PROFILE': _flag('METRICS_PROFILE', 'False'),
+        'METRICS_PROFILER': os.environ.get('METRICS_PROFILER', 'cprofile'),  # cprofile/pyinstrument
+        'METRICS_PROFILE_SAMPLE_RATE': float(os.environ.get('METRICS_PROFILE_SAMPLE_RATE', 0.1)),
+        'METRICS_PROFILE_SLOW_MS': int(os.environ.get('METRICS_PROFILE_SLOW_MS', 500)),
+    }
@@ -0,0 +1,129 @@
+"""
+Full-text search over contact messages, for the admin contacts page.
+
+Migration 6 (migrations.py) builds the index: on SQLite an FTS5 table,
+contact_fts, that triggers keep in step with the contact table (its
+tokenizer replaced by migration 8), and on PostgreSQL a generated
+tsvector column with a GIN index. Neither stems
+words nor folds accents ("jose" does not find "José", "josé" does), so
+both find the same messages. search() turns the admin's input into
+prefix terms that must all match ("jan exam" finds jane@example.com)
+and ranks the matches with bm25/ts_rank, name and email counting more
+than the message. Other databases fall back to a LIKE scan.
+
+Scoring every match of a common word takes longer than the page itself,
+so only the newest RANK_WINDOW matches are ranked; a search that matches
+more than that shows the best of the recent ones. The matched words are
+marked in Python on the rows of the page, the same way for every database.
+"""
+import re
+
+from markupsafe import Markup, escape
+
+from models import db, Contact
+from pagination import offset_paginate
+
+MAX_TERMS = 8
+RANK_WINDOW = 5000
+SNIPPET_LENGTH = 120  # Characters of the message shown around the first match
+
+TERM_RE = re.compile(r'[^\W_]+')  # Letters and digits, the way both indexes split words
+
+SQLITE_SEARCH = """
+    SELECT id FROM (
+        SELECT rowid AS id, bm25(contact_fts, 10.0, 10.0, 1.0) AS rank
+        FROM contact_fts
+        WHERE contact_fts MATCH :query
+        ORDER BY rowid DESC
+        LIMIT :window
+    ) ORDER BY rank, id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+# ts_rank reads the whole tsvector, so it runs on the window rather than on every match
+POSTGRES_SEARCH = """
+    SELECT id FROM (
+        SELECT id, search_vector
+        FROM contact
+        WHERE search_vector @@ to_tsquery('simple', :query)
+        ORDER BY id DESC
+        LIMIT :window
+    ) newest
+    ORDER BY ts_rank(search_vector, to_tsquery('simple', :query)) DESC, id DESC
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def terms(text):
+    return TERM_RE.findall(text.lower())[:MAX_TERMS]
+
+
+def _pattern(words):
+    """Words starting with any of the terms, as the indexes match them (case-insensitive, accents exact)"""
+    return re.compile(r'(?<![^\W_])(?:%s)[^\W_]*' % '|'.join(map(re.escape, words)), re.IGNORECASE)
+
+
+def _marked(text, pattern):
+    """text, escaped, with the matched words in <mark>"""
+    parts = []
+    end = 0
+    for match in pattern.finditer(text):
+        parts.append(escape(text[end:match.start()]))
+        parts.append(Markup('<mark>%s</mark>') % match.group())
+        end = match.end()
+    parts.append(escape(text[end:]))
+    return Markup('').join(parts)
+
+
+def _snippet(text, pattern):
+    """The part of text around its first match, with the matched words marked"""
+    match = pattern.search(text)
+    start = 0
+    if match and match.start() > SNIPPET_LENGTH // 3:
+        # Start at a space shortly before the match, or with no space there
+        # (a long URL, CJK text) on a window centred on the match
+        space = text.find(' ', match.start() - SNIPPET_LENGTH // 3, match.start())
+        start = space + 1 if space != -1 else match.start() - SNIPPET_LENGTH // 2
+    end = start + SNIPPET_LENGTH
+    snippet = _marked(text[start:end], pattern)
+    return Markup('…' if start else '') + snippet + Markup('…' if end < len(text) else '')
+
+
+def _fetch_ids(words, limit, offset):
+    if db.engine.dialect.name == 'postgresql':
+        statement, query = POSTGRES_SEARCH, ' & '.join(f'{word}:*' for word in words)
+    else:
+        statement, query = SQLITE_SEARCH, ' '.join(f'"{word}"*' for word in words)
+    params = {'query': query, 'window': RANK_WINDOW, 'limit': limit, 'offset': offset}
+    return [row.id for row in db.session.execute(db.text(statement), params)]
+
+
+def _fetch_like(text, limit, offset):
+    query = Contact.query.filter(
+        Contact.name.contains(text) | Contact.email.contains(text) | Contact.message.contains(text)
+    ).order_by(Contact.created_at.desc(), Contact.id.desc())
+    return query.limit(limit).offset(offset).all()
+
+
+def _fetch(text, words, limit, offset):
+    """[(contact, name, snippet), ...], best match first"""
+    if db.engine.dialect.name in ('sqlite', 'postgresql'):
+        ids = _fetch_ids(words, limit, offset) if words else []
+        by_id = {contact.id: contact for contact in Contact.query.filter(Contact.id.in_(ids))} if ids else {}
+        contacts = [by_id[id] for id in ids if id in by_id]
+    else:
+        contacts = _fetch_like(text, limit, offset)
+
+    pattern = _pattern(words or [text])
+    return [(contact, _marked(contact.name, pattern), _snippet(contact.message, pattern)) for contact in contacts]
+
+
+def search(text, per_page):
+    """
+    One Page of contacts matching text, best match first.
+
+    The items are (contact, name, snippet) tuples, where name and snippet
+    are Markup with the matched words in <mark>.
+    """
+    words = terms(text)
+    return offset_paginate(lambda limit, offset: _fetch(text, words, limit, offset), per_page)
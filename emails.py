@@ -0,0 +1,160 @@
+"""
+Outgoing email messages, built as flask_mail Messages for the outbox.
+
+Flask-Mail is imported when the first message is built, so it stays out of
+app start-up.
+"""
+from extensions import outbox
+from models import Registration
+
+
+def message(**kwargs):
+    """A flask_mail Message (subject, recipients, body/html, ...)"""
+    return outbox.message(**kwargs)
+
+
+def contact_notification(recipient, name, email, phone, text):
+    """Email to the center about a contact form submission"""
+    return message(
+        subject=f'New Contact Form Submission from {name}',
+        recipients=[recipient],
+        body=f'''
+Name: {name}
+Email: {email}
+Phone: {phone}
+Message: {text}
+                '''
+    )
+
+
+def program_registration_message(email, program_name):
+    """Confirmation for a program registration made from the modal"""
+    confirmation_message = f'''
+            <html>
+                <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                    <div style="max-width: 600px; margin: 0 auto; background-color: #f9f9f9; padding: 20px; border-radius: 8px;">
+                        <h2 style="color: #8b6bb6; margin-bottom: 20px;">🙏 Registration Confirmed!</h2>
+                        <p>Thank you for registering for our program!</p>
+
+                        <div style="background-color: #f0e6f6; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                            <h3 style="color: #8b6bb6; margin-top: 0;">Program Details:</h3>
+                            <ul style="list-style: none; padding: 0;">
+                                <li><strong>Program:</strong> {program_name}</li>
+                            </ul>
+                        </div>
+
+                        <p style="background-color: #fff3cd; padding: 10px; border-left: 4px solid #ffc107; margin: 20px 0;">
+                            <strong>Note:</strong> We'll send you program details and schedule information soon.
+                        </p>
+
+                        <p>We look forward to seeing you at our meditation center!</p>
+
+                        <div style="border-top: 1px solid #ddd; margin-top: 20px; padding-top: 20px;">
+                            <p style="font-size: 14px; color: #666;">Best regards,<br><strong>Nirvana Buddha Meditation Center</strong></p>
+                            <p style="font-size: 12px; color: #999;">📞 +91 98256 32306</p>
+                        </div>
+                    </div>
+                </body>
+            </html>
+            '''
+    return message(
+        subject='Program Registration Confirmed - Nirvana Buddha Meditation Center',
+        recipients=[email],
+        html=confirmation_message
+    )
+
+
+def session_registration_message(email, name, session_name, session_obj):
+    """Confirmation for a session registration made from the homepage modal"""
+    session_time = f"{session_obj.start_time} - {session_obj.end_time}" if session_obj.start_time and session_obj.end_time else "See schedule"
+
+    confirmation_message = f'''
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+                <div style="max-width: 600px; margin: 0 auto; background-color: #f9f9f9; padding: 20px; border-radius: 8px;">
+                    <h2 style="color: #8b6bb6; margin-bottom: 20px;">🙏 Session Registration Confirmed!</h2>
+                    <p>Hi <strong>{name}</strong>,</p>
+                    <p>Thank you for registering for our session!</p>
+
+                    <div style="background-color: #f0e6f6; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                        <h3 style="color: #8b6bb6; margin-top: 0;">Session Details:</h3>
+                        <ul style="list-style: none; padding: 0;">
+                            <li><strong>Session:</strong> {session_name}</li>
+                            <li><strong>Time:</strong> {session_time}</li>
+                        </ul>
+                    </div>
+
+                    <p style="background-color: #fff3cd; padding: 10px; border-left: 4px solid #ffc107; margin: 20px 0;">
+                        <strong>Note:</strong> Please arrive 10 minutes early. Bring your yoga mat and water bottle.
+                    </p>
+
+                    <p>We look forward to seeing you at our meditation center!</p>
+
+                    <div style="border-top: 1px solid #ddd; margin-top: 20px; padding-top: 20px;">
+                        <p style="font-size: 14px; color: #666;">Best regards,<br><strong>Nirvana Buddha Meditation Center</strong></p>
+                        <p style="font-size: 12px; color: #999;">📞 +91 98256 32306</p>
+                    </div>
+                </div>
+            </body>
+        </html>
+        '''
+    return message(
+        subject='Session Registration Confirmed - Nirvana Buddha Meditation Center',
+        recipients=[email],
+        html=confirmation_message
+    )
+
+
+def registration_message(user, program):
+    """Confirmation for a logged-in user's program registration"""
+    return message(
+        subject='Registration Confirmation - Nirvana Buddha Meditation Center',
+        recipients=[user.email],
+        html=f'''
+            <h2>Registration Confirmed!</h2>
+            <p>Dear {user.name},</p>
+            <p>Thank you for registering for our program: <strong>{program.name}</strong></p>
+            <p><strong>Program Details:</strong></p>
+            <ul>
+                <li>Date: {program.date}</li>
+                <li>Time: {program.start_time.strftime('%I:%M %p') + ' - ' + program.end_time.strftime('%I:%M %p') if program.start_time and program.end_time else program.time}</li>
+                <li>Type: {program.type.title()}</li>
+            </ul>
+            <p>We look forward to seeing you!</p>
+            <p>Best regards,<br>Nirvana Buddha Meditation Center</p>
+            '''
+    )
+
+
+def waitlist_message(email, name, program_name):
+    """Email telling a registrant that the program was full and they are on the waitlist"""
+    return message(
+        subject='Waitlist Confirmation - Nirvana Buddha Meditation Center',
+        recipients=[email],
+        html=f'''
+        <h2>You are on the waitlist</h2>
+        <p>Dear {name},</p>
+        <p><strong>{program_name}</strong> is fully booked, so we have added you to the waitlist.</p>
+        <p>We will email you as soon as a seat opens up.</p>
+        <p>Best regards,<br>Nirvana Buddha Meditation Center</p>
+        '''
+    )
+
+
+def seat_confirmed_message(booking, program):
+    """Email telling a waitlisted registrant that they now have a seat"""
+    if isinstance(booking, Registration):
+        email, name = booking.user.email, booking.user.name
+    else:
+        email, name = booking.email, booking.name
+    return message(
+        subject='Registration Confirmed - Nirvana Buddha Meditation Center',
+        recipients=[email],
+        html=f'''
+        <h2>A seat has opened up!</h2>
+        <p>Dear {name},</p>
+        <p>Your place on the waitlist for <strong>{program.name}</strong> on {program.date} is now a confirmed seat.</p>
+        <p>We look forward to seeing you!</p>
+        <p>Best regards,<br>Nirvana Buddha Meditation Center</p>
+        '''
+    )
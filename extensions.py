@@ -0,0 +1,18 @@
+"""
+Extensions used by the blueprints, one set per app.
+
+create_app() builds a MailOutbox, PageCache, RequestMetrics and
+StaticAssets for each app and keeps them in app.extensions, so apps built
+side by side (tests, scripts) do not share caches, counters or settings.
+The names below stand for the current app's instances, which lets view
+modules import them without importing app.py (and without an app existing
+yet). Code that runs outside an app context, like a worker thread, uses
+app.extensions directly.
+"""
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+outbox = LocalProxy(lambda: current_app.extensions['mail_outbox'])
+page_cache = LocalProxy(lambda: current_app.extensions['page_cache'])
+request_metrics = LocalProxy(lambda: current_app.extensions['request_metrics'])
+static_assets = LocalProxy(lambda: current_app.extensions['static_assets'])
@@ -0,0 +1,83 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+    gunicorn app:app                                  # gthread workers (default)
+    GUNICORN_WORKER_CLASS=gevent gunicorn app:app     # needs `pip install gevent`
+    GUNICORN_WORKER_CLASS=sync gunicorn app:app       # one request per process, as before
+
+Most of a request's time is spent waiting on PostgreSQL or sending image
+bytes, so workers serve several requests at once: gthread runs
+GUNICORN_THREADS request threads per process, gevent runs up to
+GUNICORN_WORKER_CONNECTIONS greenlets. Workers default to the number of
+CPUs available (at least 2, at most GUNICORN_MAX_WORKERS so a small
+instance does not run out of memory); set WEB_CONCURRENCY to pin it.
+
+The worker and thread counts are exported back into the environment so
+config.engine_options() sizes each worker's connection pool to match.
+Flask-SQLAlchemy scopes its session to the app context, so every request
+thread or greenlet gets its own session and connection.
+"""
+import os
+import sys
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')  # gthread/gevent/sync
+if worker_class == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        print("gevent is not installed, using gthread workers", file=sys.stderr)
+        worker_class = 'gthread'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY') or
+              min(max(2, _cpu_count()), int(os.environ.get('GUNICORN_MAX_WORKERS', 4))))
+threads = int(os.environ.get('GUNICORN_THREADS') or (4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))  # gevent only
+
+# Concurrent requests per worker, for the connection pool size (see config.engine_options)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(worker_connections if worker_class == 'gevent' else threads)
+
+# Import the app once in the master and fork it, so workers share its memory
+# copy-on-write. gevent has to patch the standard library before the app is
+# imported, which only happens in the worker.
+preload_app = worker_class != 'gevent'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5  # Render's proxy reuses connections
+max_requests = 2000  # Recycle workers now and then, spread out by the jitter
+max_requests_jitter = 200
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'  # Heartbeat file off the (possibly slow) container disk
+
+# Requests are logged by the app itself (request_metrics.py), as JSON
+accesslog = None
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # With preload_app, drop any pooled connections inherited from the master;
+    # sharing a socket between processes corrupts the protocol stream
+    application = sys.modules.get('app')
+    if application is not None and hasattr(application, 'app'):
+        from models import db
+        with application.app.app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # The app is loaded by now (forked from the master, or imported by a gevent
+    # worker), so start this worker's mail outbox dispatcher; it also sends the
+    # email still queued from before a restart or deploy
+    extensions = getattr(worker.wsgi, 'extensions', {})
+    if 'mail_outbox' in extensions:
+        extensions['mail_outbox'].start()
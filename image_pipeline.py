@@ -0,0 +1,119 @@
+"""
+Upload-time image processing for program photos.
+
+Admin uploads are decoded once with Pillow, EXIF-rotated, stripped of
+metadata and re-encoded into a small set of fixed-width renditions so the
+public pages never have to serve the original upload.
+
+Pillow is imported on the first upload rather than with the app, since
+only the admin upload path and the variant backfill scripts need it.
+"""
+import hashlib
+import io
+import logging
+from collections import namedtuple
+
+from werkzeug.utils import secure_filename
+
+from models import ProgramImage
+
+log = logging.getLogger(__name__)
+
+# Maximum width in pixels for each rendition (images are never upscaled)
+VARIANT_WIDTHS = {
+    'thumb': 320,
+    'card': 800,
+    'full': 1600,
+}
+
+# Output format -> (Pillow format name, MIME type, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+ProcessedImage = namedtuple('ProcessedImage', ['data', 'mime_type', 'variants'])
+
+
+def _encode(image, fmt):
+    from PIL import Image
+
+    pil_format, mime_type, options = FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode == 'RGBA':
+        # JPEG has no alpha channel - flatten transparent images onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    # No exif/icc_profile arguments are passed, so metadata is not written
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue(), mime_type
+
+
+def process_image(data):
+    """
+    Build the resized renditions of an uploaded image.
+
+    Returns a ProcessedImage whose ``data`` is the full-size JPEG (stored in
+    Program.photo_data) and whose ``variants`` is a list of dicts for every
+    other variant/format combination, or None if Pillow cannot read the upload.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        source = Image.open(io.BytesIO(data))
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB')
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        log.warning("Could not process image upload", extra={'error': str(e)})
+        return None
+
+    full_data = None
+    variants = []
+    for variant, max_width in VARIANT_WIDTHS.items():
+        image = source.copy()
+        image.thumbnail((max_width, max_width * 4), Image.LANCZOS)
+        for fmt in FORMATS:
+            encoded, mime_type = _encode(image, fmt)
+            if variant == 'full' and fmt == 'jpeg':
+                # The full JPEG is the canonical photo and lives on Program itself
+                full_data = encoded
+                continue
+            variants.append({
+                'variant': variant,
+                'format': fmt,
+                'mime_type': mime_type,
+                'width': image.width,
+                'height': image.height,
+                'data': encoded,
+            })
+
+    return ProcessedImage(data=full_data, mime_type='image/jpeg', variants=variants)
+
+
+def photo_hash(data):
+    """Content hash of an image BLOB, used as its ETag and URL version"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def set_program_photo(program, data, filename, mime_type):
+    """Store an uploaded photo on program, replacing any previous image and its variants"""
+    processed = process_image(data)
+    if processed:
+        data = processed.data
+        mime_type = processed.mime_type
+        program.images = [
+            ProgramImage(size=len(v['data']), hash=photo_hash(v['data']), **v)
+            for v in processed.variants
+        ]
+    else:
+        # Pillow could not decode it - keep the upload as-is without variants
+        program.images = []
+
+    program.photo_data = data
+    program.photo_size = len(data)
+    program.photo_hash = photo_hash(data)
+    program.photo_filename = secure_filename(filename)
+    program.photo_mime_type = mime_type or 'image/jpeg'
+    program.photo = None  # Clear old file-based path
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Import program or session registrations from a CSV file (see registration_import.py).
+
+Usage:
+    python import_registrations.py signups.csv --kind program --program "Weekend Retreat" --dry-run
+    python import_registrations.py signups.csv --kind session --session-id 12
+    python import_registrations.py signups.csv --kind session --json     # report as JSON
+
+Check the file with --dry-run first: it validates every row and reports
+what would be imported without writing anything.
+"""
+import argparse
+import json
+import sys
+
+from app import app
+from registration_import import KINDS, import_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import registrations from a CSV file')
+    parser.add_argument('path')
+    parser.add_argument('--kind', choices=KINDS, default='program')
+    parser.add_argument('--program', help='program name for rows without a program column')
+    parser.add_argument('--session-id', type=int, help='session (program ID) for rows without a session_id column')
+    parser.add_argument('--dry-run', action='store_true', help='validate and report without writing')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+
+    with app.app_context(), open(args.path, encoding='utf-8-sig', newline='') as lines:
+        try:
+            report = import_csv(lines, args.kind, program=args.program, session_id=args.session_id,
+                                dry_run=args.dry_run)
+        except ValueError as error:
+            sys.exit(f"Import failed: {error}")
+
+    if args.json:
+        print(json.dumps(report.as_dict(), indent=2))
+        return 0
+
+    action = "Would import" if report.dry_run else "Imported"
+    print(f"{action} {report.imported} of {report.rows} rows in {report.seconds:.1f}s")
+    if report.kind == 'session':
+        print(f"  waitlisted (session full): {report.waitlisted}")
+    print(f"  already registered:        {report.already_registered}")
+    print(f"  duplicates in the file:    {report.duplicates}")
+    print(f"  invalid:                   {report.invalid}")
+    for target, count in report.per_target.most_common():
+        print(f"  {target}: {count}")
+    for line, message in report.errors:
+        print(f"  line {line}: {message}")
+    if report.invalid > len(report.errors):
+        print(f"  ... and {report.invalid - len(report.errors)} more invalid rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
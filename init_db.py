@@ -2,12 +2,15 @@
 """
 Database initialization script for Render deployment
 Run this script to create all database tables and default admin user
+(same as `python migrations.py`)
 """
 
-from app import create_tables, create_admin_user
+from app import app, create_admin_user
+import migrations
 
 if __name__ == '__main__':
     print("Initializing database...")
-    create_tables()
+    with app.app_context():
+        migrations.upgrade()
     create_admin_user()
     print("Database initialization complete!")
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Persistent outbox for outgoing email.
+
+Request handlers call ``outbox.send(msg)`` instead of ``mail.send(msg)``.
+The message is written to the outbox_email table and delivered later by a
+dispatcher, either a background thread inside each app process (the
+default, started by ``outbox.start()`` when a gunicorn worker boots, see
+gunicorn.conf.py) or a separate ``python mail_worker.py`` process when
+MAIL_OUTBOX_WORKER is set to 'external'. Starting with the process rather
+than with the first ``send()`` means email still queued from before a
+restart or deploy goes out without waiting for new mail. Each batch is
+sent over a single SMTP connection, and failed messages are retried with
+exponential backoff.
+
+Flask-Mail is only imported when the first message is built or delivered,
+see emails.py and ``MailOutbox.mail``.
+"""
+import logging
+import os
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from email.utils import formataddr
+from uuid import uuid4
+
+from models import db, OutboxEmail
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 30  # Seconds before the first retry, doubled after each failure
+POLL_INTERVAL = 30  # Seconds the worker sleeps when the outbox is empty
+STALE_CLAIM = timedelta(minutes=10)  # Reclaim 'sending' rows left behind by a dead worker
+
+
+class MailOutbox:
+    def __init__(self, app=None):
+        self.app = None
+        self._mail = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self._mail = None
+        app.extensions['mail_outbox'] = self
+
+    @property
+    def mail(self):
+        """The Flask-Mail extension, set up on first use"""
+        if self._mail is None:
+            from flask_mail import Mail
+            with self._lock:
+                if self._mail is None:
+                    self._mail = Mail(self.app)
+        return self._mail
+
+    def message(self, **kwargs):
+        """Build a flask_mail Message, defaulting the sender to MAIL_DEFAULT_SENDER"""
+        from flask_mail import Message
+        sender = kwargs.pop('sender', None) or self.mail.default_sender
+        return Message(sender=sender, **kwargs)
+
+    def send(self, msg):
+        """Queue a flask_mail Message for delivery and return immediately"""
+        recipients = [r for r in msg.recipients if r]
+        if not recipients:
+            log.warning("Email not queued, no recipients", extra={'subject': msg.subject})
+            return None
+        sender = msg.sender
+        if isinstance(sender, tuple):
+            sender = formataddr(sender)
+        email = OutboxEmail(
+            subject=msg.subject,
+            recipients=','.join(recipients),
+            sender=sender,
+            reply_to=msg.reply_to,
+            body=msg.body,
+            html=msg.html,
+        )
+        db.session.add(email)
+        db.session.commit()
+        self.wake()
+        return email
+
+    def start(self):
+        """Start the dispatcher thread for this process, unless MAIL_OUTBOX_WORKER is 'external'"""
+        if self.app.config.get('MAIL_OUTBOX_WORKER', 'thread') != 'thread':
+            return
+        with self._lock:
+            # Threads do not survive fork(), so track which process started it
+            if self._thread is None or not self._thread.is_alive() or self._thread_pid != os.getpid():
+                self._thread = threading.Thread(target=self.run_forever, name='mail-outbox', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def wake(self):
+        """Nudge the dispatcher to deliver now instead of at its next poll"""
+        self._wakeup.set()
+
+    def run_forever(self):
+        """Deliver queued email until the process exits"""
+        while True:
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    delivered = self.process_batch()
+            except Exception:
+                log.exception("Mail outbox error")
+                delivered = 0
+            if not delivered:
+                self._wakeup.wait(POLL_INTERVAL)
+
+    def _claim_batch(self):
+        """Atomically mark a batch of due messages as ours and return them"""
+        now = datetime.utcnow()
+        due = db.or_(
+            db.and_(OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now),
+            db.and_(OutboxEmail.status == 'sending', OutboxEmail.claimed_at < now - STALE_CLAIM),
+        )
+        ids = [row.id for row in db.session.query(OutboxEmail.id).filter(due).order_by(OutboxEmail.id).limit(BATCH_SIZE)]
+        if not ids:
+            return []
+
+        # The conditional UPDATE makes sure two dispatchers never claim the same row
+        token = uuid4().hex
+        OutboxEmail.query.filter(OutboxEmail.id.in_(ids), due).update(
+            {'status': 'sending', 'claim_token': token, 'claimed_at': now},
+            synchronize_session=False
+        )
+        db.session.commit()
+        return OutboxEmail.query.filter_by(claim_token=token, status='sending').order_by(OutboxEmail.id).all()
+
+    def _to_message(self, email):
+        return self.message(
+            subject=email.subject,
+            recipients=email.recipients.split(','),
+            sender=email.sender or None,
+            reply_to=email.reply_to,
+            body=email.body,
+            html=email.html,
+        )
+
+    def _failed(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        email.claim_token = None
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = 'failed'
+            log.error("Email send failed, giving up", extra={'email_id': email.id, 'attempts': email.attempts, 'error': str(error)})
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (email.attempts - 1))
+            log.warning("Email send failed, will retry", extra={'email_id': email.id, 'attempts': email.attempts, 'error': str(error)})
+
+    def process_batch(self):
+        """Send one batch of due messages over a single SMTP connection. Returns the number sent."""
+        batch = self._claim_batch()
+        if not batch:
+            return 0
+
+        delivered = 0
+        metrics = self.app.extensions.get('request_metrics')
+        try:
+            with metrics.timer('smtp') if metrics else nullcontext(), self.mail.connect() as connection:
+                for email in batch:
+                    try:
+                        connection.send(self._to_message(email))
+                    except Exception as e:
+                        self._failed(email, e)
+                        continue
+                    email.status = 'sent'
+                    email.attempts += 1
+                    email.sent_at = datetime.utcnow()
+                    email.claim_token = None
+                    delivered += 1
+        except Exception as e:
+            # Could not connect (or the connection dropped) - retry whatever is left
+            for email in batch:
+                if email.status == 'sending':
+                    self._failed(email, e)
+        db.session.commit()
+        return delivered
+
+    def drain(self):
+        """Send everything that is currently due (used by tests and mail_worker.py --once)"""
+        total = 0
+        while True:
+            delivered = self.process_batch()
+            total += delivered
+            if not delivered:
+                return total
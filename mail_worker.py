@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Deliver queued email from the outbox table.
+
+Run this as a separate process when MAIL_OUTBOX_WORKER=external, or with
+--once to send whatever is currently due and exit (handy with a local
+debugging SMTP server, see README).
+"""
+import sys
+
+from app import app
+
+outbox = app.extensions['mail_outbox']
+
+if __name__ == '__main__':
+    if '--once' in sys.argv:
+        with app.app_context():
+            print(f"Sent {outbox.drain()} queued email(s)")
+    else:
+        print("Mail worker started, waiting for queued email...")
+        outbox.run_forever()
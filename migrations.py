@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations, run once per deploy as a release step.
+
+    python migrations.py            # apply pending migrations, then create the default admin
+    python migrations.py --status   # list applied and pending migrations
+
+Applied versions are recorded in the schema_version table. The runner holds
+a PostgreSQL advisory lock (a lock file next to the database on SQLite)
+while it works, so instances that start together cannot apply the same
+migration twice. Importing the app never touches the schema.
+
+To change the schema, append a function to MIGRATIONS with the next version
+number. A new database runs every migration after db.create_all() has
+built the current models, so each step must check before it alters.
+Instances on the previous release keep serving while a deploy rolls out,
+so a step must not drop or change anything that code still uses; do that
+in a later step marked @after_deploy_of(version), which waits for the
+next deploy.
+"""
+import hashlib
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from models import db, Registration, SchemaVersion, StatCounter
+import stats
+
+# pg_advisory_lock key, any constant shared by every deploy of this app
+ADVISORY_LOCK_KEY = 727_100_015
+
+
+def after_deploy_of(version):
+    """
+    Hold a migration back until `version` was applied by an earlier deploy.
+
+    For dropping what the previous release still uses: while a deploy that
+    applies `version` rolls out, instances on the old code keep running.
+    """
+    def mark(migration):
+        migration.after_deploy_of = version
+        return migration
+    return mark
+
+
+def _columns(table):
+    return {column['name'] for column in db.inspect(db.engine).get_columns(table)}
+
+
+def _add_column(table, column, ddl):
+    """Add a column if it is missing, returning True if it was added"""
+    if column in _columns(table):
+        return False
+    print(f"Adding {column} column to {table} table...")
+    db.session.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    db.session.commit()
+    return True
+
+
+def create_tables():
+    """Create missing tables (everything, on a new database)"""
+    db.create_all()
+
+
+def program_photo_columns():
+    """Photo BLOB columns on program, with the size and hash used to skip loading it"""
+    blob = 'BYTEA' if db.engine.dialect.name == 'postgresql' else 'BLOB'
+    _add_column('program', 'photo_data', blob)
+    _add_column('program', 'photo_filename', 'VARCHAR(200)')
+    _add_column('program', 'photo_mime_type', 'VARCHAR(50)')
+    if _add_column('program', 'photo_size', 'INTEGER'):
+        length = 'octet_length' if db.engine.dialect.name == 'postgresql' else 'length'
+        db.session.execute(db.text(f"UPDATE program SET photo_size = {length}(photo_data) WHERE photo_data IS NOT NULL"))
+        db.session.commit()
+    _add_column('program', 'photo_hash', 'VARCHAR(64)')
+
+    # Hash images uploaded before hashing existed (same digest as image_pipeline.photo_hash)
+    rows = db.session.execute(db.text(
+        "SELECT id, photo_data FROM program WHERE photo_data IS NOT NULL AND photo_hash IS NULL"
+    )).fetchall()
+    for row in rows:
+        db.session.execute(
+            db.text("UPDATE program SET photo_hash = :hash WHERE id = :id"),
+            {'hash': hashlib.sha256(bytes(row.photo_data)).hexdigest(), 'id': row.id}
+        )
+    db.session.commit()
+    if rows:
+        print(f"Hashed {len(rows)} program photos")
+
+
+def booking_columns():
+    """Program capacity and seat counter, and the confirmed/waitlisted booking status"""
+    _add_column('program', 'capacity', 'INTEGER')
+    _add_column('session_registration', 'status', "VARCHAR(20) NOT NULL DEFAULT 'confirmed'")
+    _add_column('registration', 'status', "VARCHAR(20) NOT NULL DEFAULT 'confirmed'")
+
+    # Registrations that slipped past the old check-then-insert race; keep the first of each
+    keep = db.select(db.func.min(Registration.id)).group_by(Registration.user_id, Registration.program_id)
+    removed = Registration.query.filter(Registration.id.not_in(keep)).delete(synchronize_session=False)
+    db.session.commit()
+    if removed:
+        print(f"Removed {removed} duplicate registrations")
+
+    if _add_column('program', 'seats_taken', 'INTEGER NOT NULL DEFAULT 0'):
+        # Count the bookings made before capacities existed as taken seats
+        db.session.execute(db.text("""
+            UPDATE program SET seats_taken =
+                (SELECT COUNT(*) FROM session_registration WHERE session_id = program.id) +
+                (SELECT COUNT(*) FROM registration WHERE program_id = program.id)
+        """))
+        db.session.commit()
+
+
+def model_indexes():
+    """Indexes declared on the models - db.create_all() only adds them for new tables"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                print(f"Creating index {index.name}...")
+                index.create(bind=db.engine)
+
+    # Replaced by the unique uq_registration_user_id_program_id
+    if 'ix_registration_user_id_program_id' in {index['name'] for index in db.inspect(db.engine).get_indexes('registration')}:
+        print("Dropping index ix_registration_user_id_program_id...")
+        db.session.execute(db.text("DROP INDEX ix_registration_user_id_program_id"))
+        db.session.commit()
+
+
+def stat_counters():
+    """Fill the dashboard counters the first time they are deployed"""
+    if not StatCounter.query.first():
+        print("Building dashboard statistics...")
+        stats.rebuild()
+
+
+def contact_search_index():
+    """Full-text index over contact name, email and message (see contact_search.py)"""
+    if db.engine.dialect.name == 'postgresql':
+        # Split emails into words so that part of an address matches; name and email rank above the message
+        _add_column('contact', 'search_vector', """tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', translate(coalesce(email, ''), '@.-_+', '     ')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(message, '')), 'B')
+        ) STORED""")
+        db.session.execute(db.text(
+            "CREATE INDEX IF NOT EXISTS ix_contact_search_vector ON contact USING GIN (search_vector)"
+        ))
+        db.session.commit()
+        return
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    print("Creating contact_fts full-text index...")
+    for statement in [
+        # External content: the text stays in contact, prefix indexes make "jan*" queries fast
+        """CREATE VIRTUAL TABLE IF NOT EXISTS contact_fts USING fts5(
+            name, email, message, content='contact', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS contact_fts_insert AFTER INSERT ON contact BEGIN
+            INSERT INTO contact_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS contact_fts_delete AFTER DELETE ON contact BEGIN
+            INSERT INTO contact_fts(contact_fts, rowid, name, email, message)
+            VALUES ('delete', old.id, old.name, old.email, old.message);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS contact_fts_update AFTER UPDATE ON contact BEGIN
+            INSERT INTO contact_fts(contact_fts, rowid, name, email, message)
+            VALUES ('delete', old.id, old.name, old.email, old.message);
+            INSERT INTO contact_fts(rowid, name, email, message) VALUES (new.id, new.name, new.email, new.message);
+        END""",
+        # Index the messages that arrived before the triggers
+        "INSERT INTO contact_fts(contact_fts) VALUES ('rebuild')",
+    ]:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+def stat_counter_shards():
+    """Add the shard column and its unique key next to the old (metric, key, period) one"""
+    # Instances still on the previous code keep upserting on the old key, so
+    # it stays until migration 9; stats.py only shards once it is gone
+    _add_column('stat_counter', 'shard', 'INTEGER NOT NULL DEFAULT 0')
+    db.session.execute(db.text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_stat_counter_metric_key_period_shard "
+        "ON stat_counter (metric, key, period, shard)"
+    ))
+    db.session.commit()
+
+
+def contact_search_accents():
+    """Rebuild contact_fts without accent folding, which the PostgreSQL index does not do either"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    ddl = db.session.execute(db.text("SELECT sql FROM sqlite_master WHERE name = 'contact_fts'")).scalar()
+    if ddl and 'remove_diacritics 0' in ddl:
+        return
+    print("Rebuilding contact_fts without accent folding...")
+    for statement in [
+        "DROP TABLE IF EXISTS contact_fts",
+        # The triggers from migration 6 are kept and write to the new table
+        """CREATE VIRTUAL TABLE contact_fts USING fts5(
+            name, email, message, content='contact', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 0', prefix='2 3'
+        )""",
+        "INSERT INTO contact_fts(contact_fts) VALUES ('rebuild')",
+    ]:
+        db.session.execute(db.text(statement))
+    db.session.commit()
+
+
+@after_deploy_of(7)
+def stat_counter_drop_unsharded_key():
+    """Drop the (metric, key, period) unique key that migration 7 replaced"""
+    if not stats.has_unsharded_key():
+        return
+    if db.engine.dialect.name == 'sqlite':
+        # A UNIQUE declared in CREATE TABLE cannot be dropped, so copy the rows into a new table
+        print("Rebuilding stat_counter without the unsharded key...")
+        db.session.execute(db.text("DROP INDEX IF EXISTS uq_stat_counter_metric_key_period_shard"))
+        db.session.execute(db.text("ALTER TABLE stat_counter RENAME TO stat_counter_unsharded"))
+        db.session.commit()
+        StatCounter.__table__.create(bind=db.engine)
+        db.session.execute(db.text(
+            'INSERT INTO stat_counter (id, metric, "key", period, shard, count) '
+            'SELECT id, metric, "key", period, shard, count FROM stat_counter_unsharded'
+        ))
+        db.session.execute(db.text("DROP TABLE stat_counter_unsharded"))
+        db.session.commit()
+        return
+
+    inspector = db.inspect(db.engine)
+    for constraint in inspector.get_unique_constraints('stat_counter'):
+        if constraint['column_names'] == list(stats.UNSHARDED_KEY):
+            print(f"Dropping constraint {constraint['name']}...")
+            db.session.execute(db.text(f'ALTER TABLE stat_counter DROP CONSTRAINT "{constraint["name"]}"'))
+    for index in inspector.get_indexes('stat_counter'):
+        if index['unique'] and index['column_names'] == list(stats.UNSHARDED_KEY):
+            print(f"Dropping index {index['name']}...")
+            db.session.execute(db.text(f'DROP INDEX IF EXISTS "{index["name"]}"'))
+    db.session.commit()
+
+
+MIGRATIONS = [
+    (1, create_tables),
+    (2, program_photo_columns),
+    (3, booking_columns),
+    (4, model_indexes),
+    (5, stat_counters),
+    (6, contact_search_index),
+    (7, stat_counter_shards),
+    (8, contact_search_accents),
+    (9, stat_counter_drop_unsharded_key),
+]
+
+
+@contextmanager
+def migration_lock():
+    """Hold a lock that only one migration runner at a time can take"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        with db.engine.connect() as connection:
+            connection.execute(db.text("SELECT pg_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+            connection.commit()
+            try:
+                yield
+            finally:
+                connection.execute(db.text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+                connection.commit()
+        return
+
+    database = db.engine.url.database
+    if dialect != 'sqlite' or not database or database == ':memory:':
+        yield
+        return
+    try:
+        import fcntl
+    except ImportError:
+        # Windows has no fcntl; local development runs a single process anyway
+        yield
+        return
+    with open(f'{database}.migrate-lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def applied_versions():
+    SchemaVersion.__table__.create(bind=db.engine, checkfirst=True)
+    return {row.version for row in SchemaVersion.query.all()}
+
+
+def upgrade():
+    """Apply every pending migration (call inside an app context). Returns the versions applied."""
+    applied = []
+    with migration_lock():
+        done = applied_versions()
+        for version, migration in MIGRATIONS:
+            if version in done:
+                continue
+            waits_for = getattr(migration, 'after_deploy_of', None)
+            if waits_for is not None and waits_for not in done:
+                print(f"Migration {version}: {migration.__name__} waits for the deploy after migration {waits_for}")
+                continue
+            print(f"Applying migration {version}: {migration.__name__}")
+            migration()
+            db.session.add(SchemaVersion(version=version, name=migration.__name__, applied_at=datetime.utcnow()))
+            db.session.commit()
+            applied.append(version)
+    return applied
+
+
+def status():
+    done = applied_versions()
+    for version, migration in MIGRATIONS:
+        state = 'applied' if version in done else 'pending'
+        print(f"{version:>4}  {migration.__name__:<24} {state}")
+
+
+if __name__ == '__main__':
+    from app import app, create_admin_user
+
+    with app.app_context():
+        print(f"Migrating {db.engine.url.render_as_string(hide_password=True)}")
+        if '--status' in sys.argv:
+            status()
+            sys.exit(0)
+        try:
+            applied = upgrade()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            sys.exit(1)
+        print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+    create_admin_user()
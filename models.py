@@ -15,6 +15,10 @@ class User(db.Model, UserMixin):
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_user_created_at', 'created_at'),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -32,6 +36,11 @@ class ProgramRegistration(db.Model):
     phone = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_program_registration_created_at', 'created_at'),
+        db.Index('ix_program_registration_program_name_created_at', 'program_name', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<ProgramRegistration {self.program_name} - {self.full_name}>'
 
@@ -42,8 +51,14 @@ class SessionRegistration(db.Model):
     name = db.Column(db.String(150), nullable=False)
     email = db.Column(db.String(150), nullable=False)
     phone = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='confirmed')  # confirmed/waitlisted (see booking.py)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_session_registration_created_at', 'created_at'),
+        db.Index('ix_session_registration_session_id_created_at', 'session_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<SessionRegistration {self.session_name} - {self.name}>'
 
@@ -57,19 +72,34 @@ class Program(db.Model):
     status = db.Column(db.String(20), default='active')  # active/inactive
     category = db.Column(db.String(100))
     photo = db.Column(db.String(200))  # Kept for backwards compatibility
-    photo_data = db.Column(db.LargeBinary)  # BLOB for image storage
+    photo_data = db.deferred(db.Column(db.LargeBinary))  # BLOB for image storage, only loaded on access
+    photo_size = db.Column(db.Integer)  # Size of photo_data in bytes, lets listings skip the BLOB
+    photo_hash = db.Column(db.String(64))  # SHA-256 of photo_data, used as ETag and URL version
     photo_filename = db.Column(db.String(200))  # Original filename
     photo_mime_type = db.Column(db.String(50))  # MIME type (image/jpeg, image/png, etc.)
     start_time = db.Column(db.Time)
     end_time = db.Column(db.Time)
+    capacity = db.Column(db.Integer)  # Seats available, None for unlimited
+    seats_taken = db.Column(db.Integer, nullable=False, default=0)  # Confirmed bookings, maintained by booking.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_program_status_date', 'status', 'date'),
+        db.Index('ix_program_created_at', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Program {self.name}>'
 
     def has_image(self):
-        """Check if program has an image stored"""
-        return self.photo_data is not None and len(self.photo_data) > 0
+        """Check if program has an image stored (without loading the BLOB)"""
+        return bool(self.photo_size)
+
+    def seats_left(self):
+        """Free seats, or None if the program has no capacity limit"""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - (self.seats_taken or 0), 0)
 
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -79,6 +109,10 @@ class Contact(db.Model):
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_contact_created_at', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Contact {self.name}>'
 
@@ -86,11 +120,18 @@ class Registration(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     program_id = db.Column(db.Integer, db.ForeignKey('program.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='confirmed')  # confirmed/waitlisted (see booking.py)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref=db.backref('registrations', lazy=True))
     program = db.relationship('Program', backref=db.backref('registrations', lazy=True))
 
+    __table_args__ = (
+        db.Index('uq_registration_user_id_program_id', 'user_id', 'program_id', unique=True),
+        db.Index('ix_registration_program_id', 'program_id'),
+        db.Index('ix_registration_created_at', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Registration User:{self.user_id} Program:{self.program_id}>'
 
@@ -100,5 +141,78 @@ class BlogPost(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_blog_post_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<BlogPost {self.title}>'
+
+class ProgramImage(db.Model):
+    """Resized rendition of a program photo (built by image_pipeline.process_image)"""
+    id = db.Column(db.Integer, primary_key=True)
+    program_id = db.Column(db.Integer, db.ForeignKey('program.id'), nullable=False)
+    variant = db.Column(db.String(20), nullable=False)  # thumb/card/full
+    format = db.Column(db.String(10), nullable=False)  # webp/jpeg
+    mime_type = db.Column(db.String(50), nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    size = db.Column(db.Integer)
+    hash = db.Column(db.String(64))
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+
+    program = db.relationship('Program', backref=db.backref('images', lazy=True, cascade='all, delete-orphan'))
+
+    __table_args__ = (db.UniqueConstraint('program_id', 'variant', 'format'),)
+
+    def __repr__(self):
+        return f'<ProgramImage Program:{self.program_id} {self.variant}/{self.format}>'
+
+class OutboxEmail(db.Model):
+    """Outgoing email waiting to be delivered by the mail_outbox dispatcher"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(300), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # Comma-separated addresses
+    sender = db.Column(db.String(150))
+    reply_to = db.Column(db.String(150))
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending/sending/sent/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))  # Set by the dispatcher that is currently sending it
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_outbox_email_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_outbox_email_claim_token', 'claim_token'),
+    )
+
+    def __repr__(self):
+        return f'<OutboxEmail {self.subject} ({self.status})>'
+
+class StatCounter(db.Model):
+    """Pre-aggregated counter for the dashboard, kept up to date by stats.increment()"""
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(50), nullable=False)  # program_registrations, contacts, signups, ...
+    key = db.Column(db.String(200), nullable=False, default='')  # Program name / session id, '' for all
+    period = db.Column(db.String(10), nullable=False, default='total')  # 'total' or YYYY-MM-DD
+    shard = db.Column(db.Integer, nullable=False, default=0)  # One of stats.SHARDS rows, summed on read
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('uq_stat_counter_metric_key_period_shard', 'metric', 'key', 'period', 'shard', unique=True),)
+
+    def __repr__(self):
+        return f'<StatCounter {self.metric}[{self.key}] {self.period}#{self.shard}={self.count}>'
+
+class SchemaVersion(db.Model):
+    """A migration from migrations.MIGRATIONS that has been applied to this database"""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
     def __repr__(self):
-        return f'<BlogPost {self.title}>'
\ No newline at end of file
+        return f'<SchemaVersion {self.version} {self.name}>'
@@ -0,0 +1,194 @@
+"""
+Rendered-response cache for the public pages.
+
+Views decorated with ``@cached`` are rendered once and then
+served from memory (or from files with PAGE_CACHE_BACKEND='file') until
+an admin edit calls ``page_cache.invalidate()``. Invalidation bumps a
+generation file on disk, so every gunicorn worker on the host notices it
+on its next request, not only the worker that handled the edit.
+
+The query string is not part of the key unless the view names the
+arguments it reads (``@cached(query_args=('page',))``), so
+made-up parameters cannot fill the cache. Both backends keep at most
+PAGE_CACHE_MAX_ENTRIES pages, and cache files from older generations are
+deleted once a worker sees the generation change.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from flask import current_app, request, session, make_response
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.enabled = False
+        self._entries = OrderedDict()
+        self._seen_generation = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.backend = app.config.get('PAGE_CACHE_BACKEND', 'memory')  # memory/file
+        self.max_entries = app.config.get('PAGE_CACHE_MAX_ENTRIES', 128)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 300)  # Seconds, safety net for missed invalidations
+        self.cache_dir = app.config.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._generation_file = os.path.join(self.cache_dir, 'generation')
+        if not os.path.exists(self._generation_file):
+            self.invalidate()
+        self._entries.clear()
+        self._seen_generation = None
+        app.extensions['page_cache'] = self
+
+    def _generation(self):
+        try:
+            st = os.stat(self._generation_file)
+        except FileNotFoundError:
+            return None
+        return f'{st.st_ino}-{st.st_mtime_ns}'
+
+    def invalidate(self):
+        """Drop every cached page (call after any change to programs or blog posts)"""
+        tmp_path = f'{self._generation_file}.{uuid4().hex}'
+        with open(tmp_path, 'w') as f:
+            f.write(uuid4().hex)
+        os.replace(tmp_path, self._generation_file)
+        if self.backend == 'file':
+            for _, path in self._page_files():
+                self._remove(path)
+
+    def _key(self, query_args):
+        # Pages show different nav links to logged-in users
+        audience = 'user' if session.get('user_id') else 'anon'
+        args = sorted((name, value) for name in query_args for value in request.args.getlist(name))
+        return f'{request.path}?{urlencode(args)}|{audience}'
+
+    def _page_files(self):
+        """[(mtime, path), ...] of the cached pages on disk, oldest first"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.page'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    pass
+        return sorted(files)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self, generation):
+        """Delete cache files written for an older generation (a worker may still write one after invalidate())"""
+        with self._lock:
+            if generation == self._seen_generation:
+                return
+            self._seen_generation = generation
+        prefix = self._generation_tag(generation)
+        for _, path in self._page_files():
+            if not os.path.basename(path).startswith(prefix):
+                self._remove(path)
+
+    def _get(self, key, generation):
+        if self.backend == 'file':
+            self._sweep(generation)
+            path = self._file_path(key, generation)
+            try:
+                if time.time() - os.path.getmtime(path) > self.ttl:
+                    return None
+                with open(path, 'rb') as f:
+                    content_type, _, body = f.read().partition(b'\n')
+                return body, content_type.decode()
+            except FileNotFoundError:
+                return None
+
+        with self._lock:
+            if generation != self._seen_generation:
+                self._entries.clear()
+                self._seen_generation = generation
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, content_type, stored_at = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, content_type
+
+    def _set(self, key, generation, body, content_type):
+        if self.backend == 'file':
+            path = self._file_path(key, generation)
+            tmp_path = f'{path}.{uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content_type.encode() + b'\n' + body)
+            os.replace(tmp_path, path)
+            files = self._page_files()
+            for _, old_path in files[:max(len(files) - self.max_entries, 0)]:
+                self._remove(old_path)
+            return
+
+        with self._lock:
+            if generation != self._seen_generation:
+                self._entries.clear()
+                self._seen_generation = generation
+            self._entries[key] = (body, content_type, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _generation_tag(self, generation):
+        return hashlib.sha1(str(generation).encode()).hexdigest()[:8]
+
+    def _file_path(self, key, generation):
+        digest = hashlib.sha1(f'{generation}|{key}'.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{self._generation_tag(generation)}-{digest}.page')
+
+    def serve(self, view, query_args, *args, **kwargs):
+        """Answer a GET request for view from the cache, or run it and cache the response"""
+        if not self.enabled or request.method != 'GET':
+            return view(*args, **kwargs)
+
+        key = self._key(query_args)
+        generation = self._generation()
+        hit = self._get(key, generation)
+        if hit:
+            body, content_type = hit
+            response = make_response(body)
+            response.headers['Content-Type'] = content_type
+            response.headers['X-Page-Cache'] = 'HIT'
+            response.vary.add('Cookie')
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            self._set(key, generation, response.get_data(), response.content_type)
+        response.headers['X-Page-Cache'] = 'MISS'
+        return response
+
+
+def cached(view=None, query_args=()):
+    """
+    Decorator that serves a GET view from the current app's page cache when possible.
+
+    query_args names the query string arguments the view reads; other
+    arguments are left out of the cache key.
+    """
+    if view is None:
+        return lambda view: cached(view, query_args)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return current_app.extensions['page_cache'].serve(view, query_args, *args, **kwargs)
+    return wrapper
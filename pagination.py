@@ -0,0 +1,84 @@
+"""
+Keyset pagination on (created_at, id) for the admin list pages and the API.
+
+Unlike OFFSET paging, each page is a single index range scan that starts
+where the previous page ended, so the cost of a page does not grow with
+how far back the admin has scrolled or with the size of the table.
+Ranked search results have no such order and use offset_paginate().
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from flask import request, url_for
+
+from models import db
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'next_url', 'first_url', 'is_first'])
+
+
+def encode_cursor(row, column='created_at'):
+    return f'{getattr(row, column).isoformat()}_{row.id}'
+
+
+def decode_cursor(value, as_date=False):
+    """Parse a cursor from the query string, returning None if it is missing or malformed"""
+    position, _, row_id = (value or '').rpartition('_')
+    try:
+        position = datetime.fromisoformat(position)
+        return (position.date() if as_date else position), int(row_id)
+    except ValueError:
+        return None
+
+
+def _url_with(cursor_arg, cursor):
+    args = request.args.to_dict()
+    args.pop(cursor_arg, None)
+    if cursor:
+        args[cursor_arg] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def keyset_paginate(query, model, per_page, cursor_arg='before', order_column=None):
+    """
+    Return one Page of query, newest first, continuing from the cursor in request.args.
+
+    Rows are ordered by order_column (a date or datetime column, created_at
+    by default) and then id, which needs an index on those columns.
+    """
+    column = model.created_at if order_column is None else order_column
+    cursor = decode_cursor(request.args.get(cursor_arg), as_date=isinstance(column.type, db.Date))
+    query = query.order_by(column.desc(), model.id.desc())
+    if cursor:
+        query = query.filter(db.tuple_(column, model.id) < cursor)
+
+    # One extra row tells us whether there is another page without a COUNT(*)
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1], column.key) if len(rows) > per_page else None
+    return Page(
+        items=items,
+        next_cursor=next_cursor,
+        next_url=_url_with(cursor_arg, next_cursor) if next_cursor else None,
+        first_url=_url_with(cursor_arg, None),
+        is_first=cursor is None,
+    )
+
+
+def offset_paginate(fetch, per_page, cursor_arg='offset'):
+    """
+    Return one Page of ranked results (see contact_search.py), continuing from the offset in request.args.
+
+    fetch(limit, offset) returns rows in rank order. Later pages cost more,
+    which is acceptable for search results, where the best matches come first.
+    """
+    offset = max(request.args.get(cursor_arg, 0, type=int), 0)
+    rows = fetch(per_page + 1, offset)
+    items = rows[:per_page]
+    next_cursor = str(offset + per_page) if len(rows) > per_page else None
+    return Page(
+        items=items,
+        next_cursor=next_cursor,
+        next_url=_url_with(cursor_arg, next_cursor) if next_cursor else None,
+        first_url=_url_with(cursor_arg, None),
+        is_first=offset == 0,
+    )
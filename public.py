@@ -0,0 +1,208 @@
+"""Public website: pages, contact form, user accounts and program images"""
+import os
+
+from flask import Blueprint, current_app, render_template, request, jsonify, redirect, url_for, session, flash, make_response, send_from_directory
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from models import db, User, Program, ProgramImage, Contact, BlogPost
+from image_pipeline import VARIANT_WIDTHS
+from extensions import outbox
+from page_cache import cached
+import emails
+import stats
+
+bp = Blueprint('public', __name__)
+
+
+@bp.route('/')
+@cached
+def index():
+    sessions = Program.query.filter_by(status='active').order_by(Program.date.desc()).all()
+    return render_template('index.html', sessions=sessions)
+
+@bp.route('/programs')
+@cached
+def programs():
+    all_programs = Program.query.filter_by(status='active').order_by(Program.date.desc()).all()
+    return render_template('programs.html', programs=all_programs)
+
+@bp.route('/about')
+@cached
+def about():
+    return render_template('about.html')
+
+@bp.route('/contact', methods=['GET', 'POST'])
+def contact():
+    if request.method == 'POST':
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+        message = request.form.get('message')
+
+        contact_entry = Contact(name=name, email=email, phone=phone, message=message)
+        db.session.add(contact_entry)
+        stats.increment('contacts')
+        db.session.commit()
+
+        # Send email notification
+        try:
+            outbox.send(emails.contact_notification(current_app.config['MAIL_USERNAME'], name, email, phone, message))
+        except Exception:
+            current_app.logger.exception("Could not queue email")
+
+        # Check if AJAX request
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({
+                'success': True,
+                'message': 'Thank you for your message! We will get back to you soon.'
+            })
+        else:
+            flash('Thank you for your message! We will get back to you soon.', 'success')
+            return redirect(url_for('public.contact'))
+
+    return render_template('contact.html')
+
+@bp.route('/blog')
+@cached
+def blog():
+    posts = BlogPost.query.order_by(BlogPost.created_at.desc()).all()
+    return render_template('blog.html', posts=posts)
+
+@bp.route('/sitemap.xml')
+def sitemap():
+    """Generate sitemap.xml"""
+    pages = [
+        {'loc': url_for('public.index', _external=True), 'lastmod': '2024-01-01', 'changefreq': 'weekly', 'priority': '1.0'},
+        {'loc': url_for('public.about', _external=True), 'lastmod': '2024-01-01', 'changefreq': 'monthly', 'priority': '0.8'},
+        {'loc': url_for('public.programs', _external=True), 'lastmod': '2024-01-01', 'changefreq': 'weekly', 'priority': '0.9'},
+        {'loc': url_for('public.contact', _external=True), 'lastmod': '2024-01-01', 'changefreq': 'monthly', 'priority': '0.7'},
+        {'loc': url_for('public.blog', _external=True), 'lastmod': '2024-01-01', 'changefreq': 'weekly', 'priority': '0.6'},
+    ]
+
+    sitemap_xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+'''
+    for page in pages:
+        sitemap_xml += f'''  <url>
+    <loc>{page['loc']}</loc>
+    <lastmod>{page['lastmod']}</lastmod>
+    <changefreq>{page['changefreq']}</changefreq>
+    <priority>{page['priority']}</priority>
+  </url>
+'''
+    sitemap_xml += '</urlset>'
+    return sitemap_xml, 200, {'Content-Type': 'application/xml'}
+
+@bp.route('/robots.txt')
+def robots():
+    """Serve robots.txt"""
+    robots_txt = f'''User-agent: *
+Allow: /
+
+Sitemap: {url_for('public.sitemap', _external=True)}
+'''
+    return robots_txt, 200, {'Content-Type': 'text/plain'}
+
+# User registration/login
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+        password = request.form.get('password')
+
+        if User.query.filter_by(email=email).first():
+            flash('Email already registered', 'error')
+            return redirect(url_for('public.register'))
+
+        user = User(
+            name=name,
+            email=email,
+            phone=phone,
+            password_hash=generate_password_hash(password)
+        )
+        db.session.add(user)
+        stats.increment('users')
+        db.session.commit()
+
+        session['user_id'] = user.id
+        flash('Registration successful!', 'success')
+        return redirect(url_for('public.index'))
+
+    return render_template('register.html')
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        email = request.form.get('email')
+        password = request.form.get('password')
+
+        user = User.query.filter_by(email=email).first()
+        if user and check_password_hash(user.password_hash, password):
+            session['user_id'] = user.id
+            flash('Login successful!', 'success')
+            return redirect(url_for('public.index'))
+        else:
+            flash('Invalid credentials', 'error')
+
+    return render_template('login.html')
+
+@bp.route('/logout')
+def logout():
+    session.pop('user_id', None)
+    return redirect(url_for('public.index'))
+
+# Image serving route for BLOB images
+@bp.route('/program-image/<int:program_id>')
+def serve_program_image(program_id):
+    """Serve program image from database BLOB
+
+    ?size=thumb|card|full picks a resized variant (WebP when the browser
+    accepts it, JPEG otherwise); without it the stored photo is served.
+    """
+    # photo_data is deferred on the model, so this only reads the metadata columns
+    program = Program.query.get_or_404(program_id)
+
+    if program.has_image():
+        image = program
+        etag = program.photo_hash
+        size = request.args.get('size')
+        if size in VARIANT_WIDTHS:
+            fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+            variant = ProgramImage.query.filter_by(program_id=program.id, variant=size, format=fmt).first()
+            if variant:
+                image = variant
+                etag = variant.hash
+
+        if etag and request.if_none_match.contains(etag):
+            # Client already has this exact image - answer without reading the BLOB
+            response = make_response('', 304)
+        elif image is program:
+            # Accessing photo_data loads the deferred BLOB
+            response = make_response(program.photo_data)
+            response.headers['Content-Type'] = program.photo_mime_type or 'image/jpeg'
+        else:
+            response = make_response(image.data)
+            response.headers['Content-Type'] = image.mime_type
+
+        if etag:
+            response.set_etag(etag)
+        if size in VARIANT_WIDTHS:
+            response.headers['Vary'] = 'Accept'
+        if program.photo_hash and request.args.get('v') == program.photo_hash:
+            # Versioned URL: the bytes behind it can never change
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'max-age=3600'  # Cache for 1 hour
+        return response
+
+    # Fallback to file-based image if BLOB doesn't exist
+    if program.photo:
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        photo_path = os.path.join(upload_folder, program.photo)
+        if os.path.exists(photo_path):
+            return send_from_directory(upload_folder, program.photo)
+
+    # Return default image
+    return send_from_directory('static/images', 'logo.png')
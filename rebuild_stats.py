@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Recompute the dashboard statistics from the registration, contact and user tables.
+Run after importing data directly into the database or to fix drifted counters.
+"""
+
+from app import app
+import stats
+
+if __name__ == '__main__':
+    with app.app_context():
+        print("Rebuilding dashboard statistics...")
+        rows = stats.rebuild()
+        print(f"Done: {rows} counter rows written")
@@ -0,0 +1,140 @@
+"""Program and session bookings from the public site"""
+from flask import Blueprint, current_app, request, jsonify, session
+from sqlalchemy.exc import IntegrityError
+
+from models import db, User, Program, Registration, ProgramRegistration, SessionRegistration
+from booking import booking_status, WAITLISTED
+from extensions import outbox
+from structured_logging import request_id
+import emails
+import stats
+
+bp = Blueprint('registration', __name__)
+
+
+@bp.route('/register_program_modal', methods=['POST'])
+def register_program_modal():
+    """Handle program registration from modal - simple registration without user account"""
+    program_name = request.form.get('program_name')
+    full_name = request.form.get('full_name')
+    phone = request.form.get('phone')
+    email = request.form.get('email')
+
+    if not all([program_name, full_name, phone]):
+        return jsonify({'error': 'Program name, full name, and phone are required'}), 400
+
+    # Create program registration record
+    program_registration = ProgramRegistration(
+        program_name=program_name,
+        full_name=full_name,
+        phone=phone,
+        email=email if email else None
+    )
+    db.session.add(program_registration)
+    stats.increment('program_registrations', key=program_name)
+    db.session.commit()
+
+    # Send confirmation email if email provided
+    if email:
+        try:
+            outbox.send(emails.program_registration_message(email, program_name))
+        except Exception:
+            current_app.logger.exception("Could not queue email")
+
+    return jsonify({'message': 'Registration successful! Confirmation email has been sent to your email address.'}), 200
+
+@bp.route('/register_session_modal', methods=['POST'])
+def register_session_modal():
+    """Handle session registration from modal"""
+    try:
+        session_id = request.form.get('session_id')
+        session_name = request.form.get('session_name')
+        name = request.form.get('name')
+        email = request.form.get('email')
+        phone = request.form.get('phone')
+
+        if not all([session_id, session_name, name, email, phone]):
+            return jsonify({'error': 'All fields are required'}), 400
+
+        session_obj = Program.query.get(int(session_id)) if session_id.isdigit() else None
+        if not session_obj:
+            return jsonify({'error': 'Session not found'}), 404
+        if session_obj.status != 'active':
+            return jsonify({'error': 'This session is not open for registration'}), 400
+
+        # Take a seat (or a waitlist place) and record the registration in one transaction
+        status = booking_status(session_obj.id)
+        session_registration = SessionRegistration(
+            session_id=session_obj.id,
+            session_name=session_name,
+            name=name,
+            email=email,
+            phone=phone,
+            status=status
+        )
+        db.session.add(session_registration)
+        stats.increment('session_registrations', key=session_registration.session_id)
+        db.session.commit()
+        current_app.logger.info("Session registration saved", extra={
+            'registration_id': session_registration.id, 'session_id': session_obj.id, 'status': status, 'sample': True})
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Error saving session registration", extra={'session_id': session_id})
+        return jsonify({'error': 'Registration failed, please try again.', 'request_id': request_id()}), 500
+
+    if status == WAITLISTED:
+        try:
+            outbox.send(emails.waitlist_message(email, name, session_name))
+        except Exception:
+            current_app.logger.exception("Could not queue email")
+        return jsonify({'message': 'This session is full - you have been added to the waitlist. We will email you if a seat opens up.', 'waitlisted': True}), 200
+
+    # Send confirmation email
+    try:
+        outbox.send(emails.session_registration_message(email, name, session_name, session_obj))
+    except Exception:
+        current_app.logger.exception("Could not queue email")
+
+    return jsonify({'message': 'Session registration successful! Confirmation email has been sent.'}), 200
+
+@bp.route('/register/<int:program_id>', methods=['POST'])
+def register_program(program_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+
+    program = Program.query.get_or_404(program_id)
+    if program.status != 'active':
+        return jsonify({'error': 'This program is not open for registration'}), 400
+
+    # Check if already registered (the unique index catches concurrent duplicates below)
+    existing = Registration.query.filter_by(user_id=session['user_id'], program_id=program_id).first()
+    if existing:
+        return jsonify({'error': 'Already registered for this program'}), 400
+
+    # Take a seat (or a waitlist place) and record the registration in one transaction
+    try:
+        status = booking_status(program_id)
+        registration = Registration(user_id=session['user_id'], program_id=program_id, status=status)
+        db.session.add(registration)
+        stats.increment('registrations', key=program_id)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request registered the same user first; its seat stays, ours is rolled back
+        db.session.rollback()
+        return jsonify({'error': 'Already registered for this program'}), 400
+
+    user = User.query.get(session['user_id'])
+    if status == WAITLISTED:
+        try:
+            outbox.send(emails.waitlist_message(user.email, user.name, program.name))
+        except Exception:
+            current_app.logger.exception("Could not queue email")
+        return jsonify({'message': 'This program is full - you have been added to the waitlist.', 'waitlisted': True}), 200
+
+    # Send confirmation email
+    try:
+        outbox.send(emails.registration_message(user, program))
+    except Exception:
+        current_app.logger.exception("Could not queue email")
+
+    return jsonify({'message': 'Registration successful! Confirmation email sent.'}), 200
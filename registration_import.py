@@ -0,0 +1,297 @@
+"""
+Bulk import of program and session registrations from a CSV file.
+
+Offline sign-ups arrive as spreadsheets. import_csv() reads the file one
+row at a time, validates each row, drops duplicates by (email, phone,
+program) - within the file and against registrations already stored -
+and inserts the rest in batches of BATCH_SIZE: a COPY per batch on
+PostgreSQL, an executemany INSERT elsewhere. The whole import is one
+transaction. With dry_run=True nothing is written and the report shows
+what the import would do.
+
+Columns are matched by header name, ignoring case, so the admin CSV
+exports can be imported as they are:
+
+    program registrations: program, full_name (or name), email, phone
+    session registrations: session_id, session (name), name, email, phone
+
+A program or session given by the caller is used for rows without one.
+Session imports take seats like the booking modal does (see booking.py):
+rows past a session's capacity are stored as waitlisted. Imports do not
+send confirmation emails. The dashboard counters are updated in the same
+transaction.
+"""
+import csv
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+from models import db, Program, ProgramRegistration, SessionRegistration
+from booking import CONFIRMED, WAITLISTED, reserve_seats
+import stats
+
+KINDS = ('program', 'session')
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+# Normalized header -> field
+HEADER_ALIASES = {
+    'program': 'program',
+    'program_name': 'program',
+    'session_id': 'session_id',
+    'session': 'session_name',
+    'session_name': 'session_name',
+    'name': 'name',
+    'full_name': 'name',
+    'email': 'email',
+    'email_address': 'email',
+    'phone': 'phone',
+    'phone_number': 'phone',
+    'mobile': 'phone',
+}
+MAX_LENGTHS = {'program': 200, 'session_name': 200, 'name': 150, 'email': 150, 'phone': 20}
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportReport:
+    """What an import did, or for a dry run would do"""
+
+    def __init__(self, kind, dry_run):
+        self.kind = kind
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.waitlisted = 0
+        self.duplicates = 0  # Repeated within the file
+        self.already_registered = 0
+        self.invalid = 0
+        self.errors = []  # (line, message) for the first MAX_REPORTED_ERRORS invalid rows
+        self.per_target = Counter()  # Program name or session ID -> rows imported
+        self.seconds = 0.0
+
+    def error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'kind': self.kind, 'dry_run': self.dry_run, 'rows': self.rows, 'imported': self.imported,
+            'waitlisted': self.waitlisted, 'duplicates': self.duplicates,
+            'already_registered': self.already_registered, 'invalid': self.invalid,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'per_target': {str(target): count for target, count in self.per_target.items()},
+            'seconds': round(self.seconds, 3),
+        }
+
+
+def _cell(value):
+    """Strip a cell, undoing the quote exports.csv_safe() puts in front of formula characters"""
+    value = (value or '').strip()
+    if value[:2] in ("'=", "'+", "'-", "'@"):
+        value = value[1:]
+    return value
+
+
+def _key(email, phone):
+    return (email or '').strip().lower(), re.sub(r'\D', '', phone or '')
+
+
+class _Importer:
+    def __init__(self, kind, program, session_id, dry_run):
+        self.kind = kind
+        self.default_target = program if kind == 'program' else session_id
+        self.dry_run = dry_run
+        self.report = ImportReport(kind, dry_run)
+        self.seen = {}  # Target -> {(email, phone)} already stored or earlier in the file
+        self.stored = {}  # Target -> {(email, phone)} already stored
+        self.sessions = {}  # Session ID -> Program name, or None if there is no such program
+        self.free_seats = {}  # Session ID -> seats left, for dry runs
+        self.pending = []
+
+    def check_header(self, fieldnames):
+        """Map the CSV's headers to fields, raising ValueError if a required column is missing"""
+        columns = {}
+        for header in fieldnames or []:
+            field = HEADER_ALIASES.get(header.strip().lstrip('\ufeff').lower().replace(' ', '_'))
+            if field and field not in columns:
+                columns[field] = header
+        required = ['name', 'email', 'phone']
+        if self.default_target is None:
+            required.append('program' if self.kind == 'program' else 'session_id')
+        missing = [field for field in required if field not in columns]
+        if missing:
+            raise ValueError(f"Missing column(s): {', '.join(missing)}")
+        return columns
+
+    def session_name(self, session_id):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = db.session.execute(
+                db.select(Program.name).where(Program.id == session_id)
+            ).scalar()
+        return self.sessions[session_id]
+
+    def parse(self, values):
+        """Validated fields of a row, or raise ValueError with the reason"""
+        for field in ('name', 'email', 'phone'):
+            if not values.get(field):
+                raise ValueError(f"Missing {field}")
+        if not EMAIL_RE.match(values['email']):
+            raise ValueError("Invalid email")
+        if not re.search(r'\d', values['phone']):
+            raise ValueError("Invalid phone")
+
+        if self.kind == 'program':
+            values['program'] = values.get('program') or self.default_target
+            if not values['program']:
+                raise ValueError("Missing program")
+            target = values['program']
+        else:
+            session_id = values.get('session_id') or self.default_target
+            if not str(session_id or '').isdigit():
+                raise ValueError("Missing or invalid session_id")
+            target = int(session_id)
+            name = self.session_name(target)
+            if name is None:
+                raise ValueError(f"Unknown session {target}")
+            values['session_name'] = values.get('session_name') or name
+
+        for field, length in MAX_LENGTHS.items():
+            if len(values.get(field) or '') > length:
+                raise ValueError(f"{field} is longer than {length} characters")
+        return target, values
+
+    def stored_keys(self, target):
+        if self.kind == 'program':
+            stmt = db.select(ProgramRegistration.email, ProgramRegistration.phone).where(
+                ProgramRegistration.program_name == target)
+        else:
+            stmt = db.select(SessionRegistration.email, SessionRegistration.phone).where(
+                SessionRegistration.session_id == target)
+        return {_key(email, phone) for email, phone in db.session.execute(stmt)}
+
+    def add(self, line, row, columns):
+        self.report.rows += 1
+        values = {field: _cell(row.get(header)) for field, header in columns.items()}
+        try:
+            target, values = self.parse(values)
+        except ValueError as error:
+            self.report.error(line, str(error))
+            return
+
+        if target not in self.seen:
+            self.stored[target] = self.stored_keys(target)
+            self.seen[target] = set(self.stored[target])
+        key = _key(values['email'], values['phone'])
+        if key in self.seen[target]:
+            if key in self.stored[target]:
+                self.report.already_registered += 1
+            else:
+                self.report.duplicates += 1
+            return
+        self.seen[target].add(key)
+
+        self.pending.append((target, values))
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def take_seats(self, session_id, count):
+        if not self.dry_run:
+            return reserve_seats(session_id, count)
+        if session_id not in self.free_seats:
+            capacity, taken = db.session.execute(
+                db.select(Program.capacity, Program.seats_taken).where(Program.id == session_id)
+            ).one()
+            self.free_seats[session_id] = None if capacity is None else max(capacity - taken, 0)
+        free = self.free_seats[session_id]
+        if free is None:
+            return count
+        self.free_seats[session_id] = free - min(free, count)
+        return min(free, count)
+
+    def flush(self):
+        if not self.pending:
+            return
+        now = datetime.utcnow()
+        counts = Counter(target for target, values in self.pending)
+
+        if self.kind == 'program':
+            model, metric = ProgramRegistration, 'program_registrations'
+            rows = [{'program_name': target, 'full_name': values['name'], 'email': values['email'],
+                     'phone': values['phone'], 'created_at': now} for target, values in self.pending]
+        else:
+            # Seats go to rows in file order; the rest of each session's rows are waitlisted
+            model, metric = SessionRegistration, 'session_registrations'
+            seats = {target: self.take_seats(target, count) for target, count in counts.items()}
+            rows = []
+            for target, values in self.pending:
+                status = CONFIRMED if seats[target] > 0 else WAITLISTED
+                seats[target] -= 1
+                self.report.waitlisted += status == WAITLISTED
+                rows.append({'session_id': target, 'session_name': values['session_name'], 'name': values['name'],
+                             'email': values['email'], 'phone': values['phone'], 'status': status,
+                             'created_at': now})
+
+        if not self.dry_run:
+            insert_rows(model, rows)
+            for target, count in counts.items():
+                stats.increment(metric, key=target, when=now, amount=count)
+
+        self.report.imported += len(rows)
+        self.report.per_target.update(counts)
+        self.pending = []
+
+
+def insert_rows(model, rows):
+    """Insert a batch of row dicts: COPY on PostgreSQL, an executemany INSERT elsewhere"""
+    if db.engine.dialect.name != 'postgresql':
+        db.session.execute(db.insert(model), rows)
+        return
+
+    columns = list(rows[0])
+    preparer = db.engine.dialect.identifier_preparer
+    sql = (f"COPY {preparer.format_table(model.__table__)} "
+           f"({', '.join(preparer.quote(column) for column in columns)}) FROM STDIN")
+    # The psycopg connection behind the session, so COPY runs in the same transaction
+    connection = db.session.connection().connection.driver_connection
+    with connection.cursor() as cursor, cursor.copy(sql) as copy:
+        for row in rows:
+            copy.write_row([row[column] for column in columns])
+
+
+def import_csv(lines, kind, program=None, session_id=None, dry_run=False):
+    """Import registrations from CSV text (a file object or any iterable of lines) and return an ImportReport.
+
+    kind is 'program' or 'session'; program/session_id fill in rows that
+    do not name one. Raises ValueError if the header is unusable or the
+    default session does not exist. Commits unless dry_run is set, in
+    which case everything is rolled back.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown import kind {kind!r}")
+    started = time.perf_counter()
+    importer = _Importer(kind, program or None, session_id or None, dry_run)
+    if kind == 'session' and importer.default_target is not None:
+        importer.default_target = int(importer.default_target)
+        if importer.session_name(importer.default_target) is None:
+            raise ValueError(f"Unknown session {importer.default_target}")
+
+    reader = csv.DictReader(lines)
+    columns = importer.check_header(reader.fieldnames)
+    try:
+        for row in reader:
+            if not any((value or '').strip() for value in row.values() if isinstance(value, str)):
+                continue
+            importer.add(reader.line_num, row, columns)
+        importer.flush()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    importer.report.seconds = time.perf_counter() - started
+    return importer.report
@@ -0,0 +1,328 @@
+"""
+Per-request timing and SQL instrumentation.
+
+With METRICS_ENABLED, every request records its wall time, the number and
+total time of its SQL queries (SQLAlchemy engine events), template render
+time and SMTP time, grouped by endpoint. The totals are served in the
+Prometheus text format at /metrics (protected by METRICS_TOKEN when set).
+METRICS_SERVER_TIMING adds a Server-Timing header to every response so the
+breakdown shows up in the browser's network panel.
+
+METRICS_PROFILE turns on sampled profiling: a METRICS_PROFILE_SAMPLE_RATE
+fraction of requests run under cProfile (or pyinstrument if
+METRICS_PROFILER='pyinstrument' and it is installed), and the profile of
+any sampled request slower than METRICS_PROFILE_SLOW_MS is written to
+instance/profiles/.
+
+The connection pool is reported too: its size, checked-out and overflow
+connections as gauges, and counters of new connections, checkouts and
+invalidated (dropped) connections, to tune the DB_POOL_* settings. So is
+response compression (compression.py): bytes before and after, by
+encoding and content type, whose ratio is the compression ratio.
+
+Counters live in each process, so every gunicorn worker reports its own
+numbers under a `worker` label; sum over it in Prometheus. Each request
+is also logged with its timings and request ID (sampled, see
+structured_logging.py), which ties a slow series back to single requests.
+Wall time of streamed responses (CSV exports) only covers producing the
+first chunk.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import Response, abort, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._routes = {}  # endpoint -> totals, see _record()
+        self._requests = {}  # (endpoint, method, status) -> count
+        self._timers = {}  # kind -> [count, seconds] for timer() blocks, inside requests or not
+        self._pool_events = {'connect': 0, 'checkout': 0, 'invalidate': 0}
+        self._compression = {}  # (encoding, mimetype) -> [responses, bytes in, bytes out]
+        self._engine = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.app = app
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        self.token = app.config.get('METRICS_TOKEN')
+        self.profile = app.config.get('METRICS_PROFILE', False)
+        self.profiler = app.config.get('METRICS_PROFILER', 'cprofile')  # cprofile/pyinstrument
+        self.profile_sample_rate = app.config.get('METRICS_PROFILE_SAMPLE_RATE', 0.1)
+        self.profile_slow_ms = app.config.get('METRICS_PROFILE_SLOW_MS', 500)
+        self.profile_dir = app.config.get('METRICS_PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+        app.extensions['request_metrics'] = self
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        for name in self._pool_events:
+            event.listen(engine, name, self._pool_event_counter(name))
+        self._engine = engine
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        if self.profile and self.profiler == 'pyinstrument':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                log.warning("pyinstrument is not installed, profiling with cProfile instead")
+                self.profiler = 'cprofile'
+
+    # Per-request bookkeeping
+
+    def _start(self):
+        g._metrics = {'start': time.perf_counter(), 'sql_count': 0, 'sql': 0.0, 'template': 0.0,
+                      'smtp': 0.0, 'recorded': False, 'profiler': None}
+        if self.profile and random.random() < self.profile_sample_rate:
+            g._metrics['profiler'] = self._start_profiler()
+
+    def _finish(self, response):
+        state = g.get('_metrics')
+        if state is None or state['recorded']:
+            return response
+        elapsed = self._record(state, response.status_code)
+        if self.server_timing:
+            response.headers['Server-Timing'] = ', '.join([
+                f"app;dur={elapsed * 1000:.1f}",
+                f"db;dur={state['sql'] * 1000:.1f};desc=\"{state['sql_count']} queries\"",
+                f"tpl;dur={state['template'] * 1000:.1f}",
+                f"smtp;dur={state['smtp'] * 1000:.1f}",
+            ])
+        return response
+
+    def _teardown(self, exc):
+        # Requests that raised never reach after_request
+        state = g.get('_metrics')
+        if state is not None and not state['recorded']:
+            self._record(state, 500)
+
+    def _record(self, state, status):
+        elapsed = time.perf_counter() - state['start']
+        state['recorded'] = True
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {
+                    'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'seconds': 0.0,
+                    'sql_count': 0, 'sql': 0.0, 'template': 0.0, 'smtp': 0.0,
+                }
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    route['buckets'][i] += 1
+            route['count'] += 1
+            route['seconds'] += elapsed
+            for key in ('sql_count', 'sql', 'template', 'smtp'):
+                route[key] += state[key]
+            key = (endpoint, request.method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+        log.info("Request handled", extra={
+            'method': request.method, 'path': request.path, 'endpoint': endpoint, 'status': status,
+            'duration_ms': round(elapsed * 1000, 1), 'sql_count': state['sql_count'],
+            'sql_ms': round(state['sql'] * 1000, 1), 'template_ms': round(state['template'] * 1000, 1),
+            'smtp_ms': round(state['smtp'] * 1000, 1), 'sample': True,
+        })
+        if state['profiler'] is not None:
+            self._stop_profiler(state['profiler'], elapsed, endpoint)
+        return elapsed
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, not the pooled connection, so a
+        # statement that raises (no after_cursor_execute) leaves nothing behind
+        if context is not None:
+            context._metrics_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_query_start', None)
+        if started is None:
+            return
+        if has_request_context():
+            state = g.get('_metrics')
+            if state is not None:
+                state['sql_count'] += 1
+                state['sql'] += time.perf_counter() - started
+
+    def _pool_event_counter(self, name):
+        def count(*args):
+            with self._lock:
+                self._pool_events[name] += 1
+        return count
+
+    def _before_render(self, sender, template, context, **extra):
+        state = g.get('_metrics')
+        if state is not None:
+            state['_template_start'] = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        state = g.get('_metrics')
+        if state is not None and '_template_start' in state:
+            state['template'] += time.perf_counter() - state.pop('_template_start')
+
+    @contextmanager
+    def timer(self, kind):
+        """Time a block of outbound work (e.g. 'smtp'), inside a request or not"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    totals = self._timers.setdefault(kind, [0, 0.0])
+                    totals[0] += 1
+                    totals[1] += elapsed
+                if has_request_context():
+                    state = g.get('_metrics')
+                    if state is not None and kind in state:
+                        state[kind] += elapsed
+
+    def record_compression(self, encoding, mimetype, size_in, size_out):
+        """Count a response compressed by CompressionMiddleware"""
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = self._compression.setdefault((encoding, mimetype), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += size_in
+            totals[2] += size_out
+
+    # Profiling
+
+    def _start_profiler(self):
+        if self.profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, elapsed, endpoint):
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+        else:
+            profiler.disable()
+        if elapsed * 1000 < self.profile_slow_ms:
+            return
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            name = f"{datetime.utcnow():%Y%m%d-%H%M%S}-{endpoint}-{int(elapsed * 1000)}ms-{os.getpid()}"
+            if self.profiler == 'pyinstrument':
+                path = os.path.join(self.profile_dir, name + '.html')
+                with open(path, 'w') as f:
+                    f.write(profiler.output_html())
+            else:
+                path = os.path.join(self.profile_dir, name + '.prof')
+                profiler.dump_stats(path)
+            log.warning("Slow request profiled", extra={
+                'method': request.method, 'path': request.path, 'duration_ms': round(elapsed * 1000, 1), 'profile': path})
+        except Exception:
+            log.exception("Could not save profile")
+
+    # Prometheus endpoint
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        worker = f'worker="{os.getpid()}"'
+        with self._lock:
+            routes = {endpoint: dict(route, buckets=list(route['buckets'])) for endpoint, route in self._routes.items()}
+            requests = dict(self._requests)
+            timers = {kind: list(totals) for kind, totals in self._timers.items()}
+            pool_events = dict(self._pool_events)
+            compression = {key: list(totals) for key, totals in self._compression.items()}
+
+        lines = [
+            '# HELP app_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE app_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'app_requests_total{{{worker},endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP app_request_duration_seconds Request wall time, by endpoint.',
+            '# TYPE app_request_duration_seconds histogram',
+        ]
+        for endpoint, route in sorted(routes.items()):
+            labels = f'{worker},endpoint="{endpoint}"'
+            for bound, count in zip(DURATION_BUCKETS, route['buckets']):
+                lines.append(f'app_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'app_request_duration_seconds_bucket{{{labels},le="+Inf"}} {route["count"]}')
+            lines.append(f'app_request_duration_seconds_sum{{{labels}}} {route["seconds"]:.6f}')
+            lines.append(f'app_request_duration_seconds_count{{{labels}}} {route["count"]}')
+
+        for name, key, help_text in (
+            ('app_sql_queries_total', 'sql_count', 'SQL statements executed while handling requests, by endpoint.'),
+            ('app_sql_seconds_total', 'sql', 'Time spent in SQL statements while handling requests, by endpoint.'),
+            ('app_template_render_seconds_total', 'template', 'Time spent rendering templates, by endpoint.'),
+            ('app_smtp_seconds_total', 'smtp', 'Time spent talking to the SMTP server inside requests, by endpoint.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for endpoint, route in sorted(routes.items()):
+                value = route[key] if key == 'sql_count' else f'{route[key]:.6f}'
+                lines.append(f'{name}{{{worker},endpoint="{endpoint}"}} {value}')
+
+        lines += [
+            '# HELP app_outbound_seconds Time spent on outbound calls (e.g. SMTP from the mail outbox), by kind.',
+            '# TYPE app_outbound_seconds summary',
+        ]
+        for kind, (count, seconds) in sorted(timers.items()):
+            lines.append(f'app_outbound_seconds_sum{{{worker},kind="{kind}"}} {seconds:.6f}')
+            lines.append(f'app_outbound_seconds_count{{{worker},kind="{kind}"}} {count}')
+
+        pool = self._engine.pool if self._engine is not None else None
+        if hasattr(pool, 'checkedout'):
+            # QueuePool (SQLite in-memory databases use a pool without these counts)
+            for name, value, help_text in (
+                ('app_db_pool_size', pool.size(), 'Connections the pool keeps open.'),
+                ('app_db_pool_checked_out', pool.checkedout(), 'Connections currently in use.'),
+                ('app_db_pool_overflow', max(0, pool.overflow()), 'Connections open beyond the pool size.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name}{{{worker}}} {value}']
+        for name, key, help_text in (
+            ('app_db_pool_connections_total', 'connect', 'New database connections opened.'),
+            ('app_db_pool_checkouts_total', 'checkout', 'Connections handed out by the pool.'),
+            ('app_db_pool_invalidations_total', 'invalidate', 'Connections dropped as broken (e.g. failed pre-ping).'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter', f'{name}{{{worker}}} {pool_events[key]}']
+
+        for name, index, help_text in (
+            ('app_compressed_responses_total', 0, 'Responses compressed, by encoding and content type.'),
+            ('app_compression_input_bytes_total', 1, 'Bytes of those responses before compression.'),
+            ('app_compression_output_bytes_total', 2, 'Bytes of those responses after compression.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for (encoding, mimetype), totals in sorted(compression.items()):
+                lines.append(f'{name}{{{worker},encoding="{encoding}",content_type="{mimetype}"}} {totals[index]}')
+        return '\n'.join(lines) + '\n'
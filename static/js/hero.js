@@ -1,30 +1,53 @@
 (function() {
-    const updateHeroForViewport = () => {
-        const gif = document.querySelector('.nb-hero-gif');
-        const poster = document.querySelector('.nb-hero-poster');
+    // The hero video has no src in the page, so the first load never downloads it. It is
+    // attached after the load event once the hero is on screen: the small rendition on
+    // phones or with Save-Data, nothing with prefers-reduced-motion (the poster stays).
+    const wantsSmallVideo = () => {
+        const saveData = navigator.connection && navigator.connection.saveData;
+        return saveData || window.matchMedia('(max-width: 768px)').matches;
+    };
 
-        if (!gif) return;
+    const attachVideo = (video) => {
+        const small = video.dataset.srcSmall;
+        video.src = small && wantsSmallVideo() ? small : video.dataset.src;
+        video.setAttribute('data-attached', 'true');
+    };
 
-        // Always show the GIF on all devices for better user experience
-        // The CSS will handle responsive sizing
-        try {
-            gif.style.display = 'block';
-            gif.setAttribute('aria-hidden', 'false');
-            if (poster) {
-                poster.style.display = 'none';
-                poster.setAttribute('aria-hidden', 'true');
-            }
-        } catch (err) {
-            // ignore errors when toggling display
+    const play = (video) => {
+        const playing = video.play();
+        if (playing && playing.catch) {
+            playing.catch(() => {}); // Autoplay blocked - the poster stays
         }
     };
 
-    // Run at load and on resize (debounced)
-    document.addEventListener('DOMContentLoaded', updateHeroForViewport);
-    let _heroResizeTimer = null;
-    window.addEventListener('resize', () => {
-        if (_heroResizeTimer) clearTimeout(_heroResizeTimer);
-        _heroResizeTimer = setTimeout(updateHeroForViewport, 150);
-    });
-    window.addEventListener('orientationchange', () => setTimeout(updateHeroForViewport, 200));
-})();
\ No newline at end of file
+    const initHeroVideo = () => {
+        const video = document.querySelector('.nb-hero-video[data-src]');
+        if (!video) return;
+        if (window.matchMedia('(prefers-reduced-motion: reduce)').matches) return;
+
+        if (!('IntersectionObserver' in window)) {
+            attachVideo(video);
+            play(video);
+            return;
+        }
+
+        // Attach on first sight, then pause while the hero is scrolled out of view
+        const observer = new IntersectionObserver((entries) => {
+            entries.forEach((entry) => {
+                if (!entry.isIntersecting) {
+                    video.pause();
+                    return;
+                }
+                if (!video.hasAttribute('data-attached')) attachVideo(video);
+                play(video);
+            });
+        }, { threshold: 0.25 });
+        observer.observe(video);
+    };
+
+    if (document.readyState === 'complete') {
+        initHeroVideo();
+    } else {
+        window.addEventListener('load', initHeroVideo);
+    }
+})();
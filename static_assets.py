@@ -0,0 +1,286 @@
+"""
+Fingerprinted, precompressed static assets.
+
+`python build_assets.py` (a build step, see render.yaml) copies the CSS,
+JavaScript and images under static/ to static/dist/ with a content hash
+in the filename (css/style.css -> dist/css/style.1a2b3c4d5e6f.css),
+minifies the CSS (and the JavaScript when rjsmin is installed), writes
+.gz and, when the brotli package is installed, .br copies of the text
+files, adds resized variants of the images (see static_images.py) and
+a poster and smaller rendition of the videos (see static_video.py), and
+lists everything in static/dist/manifest.json.
+
+With a manifest present, url_for('static', filename='css/style.css')
+returns the fingerprinted URL, so templates stay as they are. Since a
+fingerprinted file never changes, it is served with a one-year immutable
+Cache-Control and browsers do not revalidate it on repeat visits. Its
+ETag is the content hash, the same on every instance, and Range
+requests get 206 responses. The .br/.gz copy is sent to clients that
+accept it. Without a manifest (or
+for a file edited after the last build) the plain file is served as
+before. static_image(filename) and static_video(filename), available
+in templates, return an image's variants for the picture() macro and a
+video's renditions and poster.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import time
+
+from flask import current_app, request, send_from_directory, url_for
+
+import static_images
+import static_video
+
+try:
+    import brotli
+except ImportError:  # Optional: `pip install brotli`
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:  # Optional: `pip install rjsmin`, JavaScript is copied as is without it
+    rjsmin = None
+
+log = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+SOURCE_DIRS = ('css', 'js', 'images', 'videos')  # uploads/ are not fingerprinted
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Content-Encoding -> suffix of the precompressed copy, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def minify_css(text):
+    """Drop comments and insignificant whitespace (a conservative minifier, no rewriting of rules)"""
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def _fingerprinted(path, data):
+    stem, ext = os.path.splitext(path)
+    return f'{DIST_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def _rewrite_css_urls(text, css_path, assets):
+    """Point relative url(...) references at the fingerprinted files, as absolute /static/ paths"""
+    def replace(match):
+        target = match.group(2)
+        if target.startswith(('/', 'data:', 'http:', 'https:', '#')):
+            return match.group(0)
+        resolved = os.path.normpath(os.path.join(os.path.dirname(css_path), target.split('?')[0].split('#')[0]))
+        entry = assets.get(resolved.replace(os.sep, '/'))
+        return f"url('/static/{entry['path']}')" if entry else match.group(0)
+    return CSS_URL_RE.sub(replace, text)
+
+
+def _write(static_folder, path, data):
+    full_path = os.path.join(static_folder, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(data)
+
+    encodings = []
+    if path.endswith(COMPRESSIBLE):
+        if brotli is not None:
+            with open(full_path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+            encodings.append('br')
+        with open(full_path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        encodings.append('gzip')
+    return encodings
+
+
+def _add_variants(static_folder, path, data, entry):
+    """Write the resized variants of an image and record them on its manifest entry"""
+    result = static_images.variants(data)
+    if result is None:
+        return
+    (entry['width'], entry['height']), encoded = result
+    entry['variants'] = {}
+    stem = os.path.splitext(path)[0]
+    for fmt, mime_type, width, variant in encoded:
+        variant_path = _fingerprinted(f'{stem}.{width}w.{fmt}', variant)
+        _write(static_folder, variant_path, variant)
+        entry['variants'].setdefault(mime_type, []).append([width, variant_path])
+        entry['fallback'] = mime_type  # The last format listed, JPEG or PNG
+
+
+def _add_video(static_folder, path, entry):
+    """Write a poster frame and a smaller rendition of a video and record them on its manifest entry"""
+    source = os.path.join(static_folder, path)
+    stem = os.path.splitext(path)[0]
+    entry['width'], entry['height'] = static_video.size(source)
+
+    poster = static_video.poster(source)
+    entry['poster'] = _fingerprinted(f'{stem}.poster.jpg', poster)
+    _write(static_folder, entry['poster'], poster)
+
+    small = static_video.rendition(source)
+    entry['small'] = _fingerprinted(f'{stem}.small.mp4', small)
+    _write(static_folder, entry['small'], small)
+
+
+def build(static_folder):
+    """Rebuild static/dist/ and its manifest, returning the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    sources = []
+    for directory in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(static_folder, directory)):
+            for name in sorted(files):
+                sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+
+    # Images first, so the stylesheets can refer to their fingerprinted names
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+    images = static_images.available()
+    videos = static_video.available()
+    assets = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = minify_css(_rewrite_css_urls(data.decode('utf-8'), path, assets)).encode('utf-8')
+        elif path.endswith('.js') and rjsmin is not None:
+            data = rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+        elif path.endswith('.ico') and images:
+            data = static_images.icon(data) or data
+
+        output = _fingerprinted(path, data)
+        assets[path] = {'path': output, 'encodings': _write(static_folder, output, data)}
+        if images and path.lower().endswith(static_images.RESIZABLE):
+            _add_variants(static_folder, path, data, assets[path])
+        elif videos and path.lower().endswith(static_video.VIDEO_EXTENSIONS):
+            _add_video(static_folder, path, assets[path])
+
+    manifest = {'built_at': time.time(), 'assets': assets}
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class StaticAssets:
+    def __init__(self, app=None):
+        self.urls = {}  # Source filename -> fingerprinted filename
+        self.encodings = {}  # Fingerprinted filename -> precompressed encodings available
+        self.images = {}  # Source filename -> manifest entry with size and variants
+        self.videos = {}  # Source filename -> manifest entry with poster and rendition
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.urls = {}
+        self.encodings = {}
+        self.images = {}
+        self.videos = {}
+        if app.config.get('STATIC_ASSETS_FINGERPRINT', True):
+            self._load(app.static_folder)
+        app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.send_static_file
+        app.add_template_global(self.image, 'static_image')
+        app.add_template_global(self.video, 'static_video')
+        app.extensions['static_assets'] = self
+
+    def _load(self, static_folder):
+        try:
+            with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+
+        stale = []
+        for source, entry in manifest['assets'].items():
+            try:
+                if os.stat(os.path.join(static_folder, source)).st_mtime > manifest['built_at']:
+                    stale.append(source)
+                    continue
+            except FileNotFoundError:
+                continue
+            self.urls[source] = entry['path']
+            self.encodings[entry['path']] = entry['encodings']
+            if entry.get('variants'):
+                self.images[source] = entry
+                for variants in entry['variants'].values():
+                    self.encodings.update((path, []) for width, path in variants)
+            for key in ('poster', 'small'):
+                if entry.get(key):
+                    self.encodings[entry[key]] = []
+                    self.videos[source] = entry
+        if stale:
+            log.warning("Static files changed since build_assets.py ran, serving them unfingerprinted",
+                        extra={'files': stale})
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.urls:
+            values['filename'] = self.urls[values['filename']]
+
+    def image(self, filename):
+        """URLs, srcsets and size of a static image, for the picture() macro"""
+        entry = self.images.get(filename)
+        if entry is None:
+            return {'src': url_for('static', filename=filename), 'srcset': '', 'sources': [],
+                    'width': None, 'height': None}
+
+        def srcset(variants):
+            return ', '.join(f"{url_for('static', filename=path)} {width}w" for width, path in variants)
+
+        fallback = entry['variants'][entry['fallback']]
+        return {
+            'src': url_for('static', filename=fallback[-1][1]),
+            'srcset': srcset(fallback),
+            'sources': [(mime_type, srcset(variants)) for mime_type, variants in entry['variants'].items()
+                        if mime_type != entry['fallback']],
+            'width': entry['width'],
+            'height': entry['height'],
+        }
+
+    def video(self, filename):
+        """URLs of a static video, its smaller rendition and poster (None if not built) and its size"""
+        entry = self.videos.get(filename, {})
+        return {
+            'src': url_for('static', filename=filename),
+            'small': url_for('static', filename=entry['small']) if entry.get('small') else None,
+            'poster': url_for('static', filename=entry['poster']) if entry.get('poster') else None,
+            'width': entry.get('width'),
+            'height': entry.get('height'),
+        }
+
+    def send_static_file(self, filename):
+        """The app's static view, with immutable caching and precompressed copies for dist/ files"""
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return current_app.send_static_file(filename)
+
+        suffix = ''
+        encoding = None
+        for name, extension in ENCODINGS:
+            if name in encodings and request.accept_encodings[name]:
+                encoding, suffix = name, extension
+                break
+
+        # The fingerprint in the name is the content hash: name.<hash>.ext
+        etag = filename.rsplit('.', 2)[-2] + (f'-{encoding}' if encoding else '')
+        response = send_from_directory(current_app.static_folder, filename + suffix,
+                                       mimetype=mimetypes.guess_type(filename)[0], max_age=31536000, etag=etag)
+        response.headers['Cache-Control'] = IMMUTABLE
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        return response
+
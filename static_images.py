@@ -0,0 +1,91 @@
+"""
+Responsive variants of the images in static/images, made by build_assets.py.
+
+Each JPEG/PNG is resized to the widths in WIDTHS that are smaller than it
+(never upscaled) and encoded as AVIF when Pillow can write it, WebP, and
+a JPEG fallback (PNG for images with transparency). The .ico files are
+rebuilt as real 16-48px icons. static_assets.build() writes the results
+under fingerprinted names and records them in the manifest, and the
+picture() macro in templates/_picture.html renders them as a <picture>
+with srcset, sizes and width/height attributes.
+
+Pillow is imported when a build runs, not with the app.
+"""
+import io
+
+WIDTHS = (160, 320, 640, 960, 1280, 1920)
+ICON_SIZES = ((16, 16), (32, 32), (48, 48))
+
+# Output format -> (Pillow format name, MIME type, save options)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 55}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+RESIZABLE = ('.jpeg', '.jpg', '.png')
+
+
+def available():
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _formats(image):
+    from PIL import Image
+
+    try:
+        import pillow_avif  # noqa: F401 - registers AVIF with older Pillow versions
+    except ImportError:
+        pass
+    Image.init()
+    formats = ['avif'] if 'AVIF' in Image.SAVE else []
+    return formats + ['webp', 'png' if image.mode == 'RGBA' else 'jpeg']
+
+
+def _encode(image, fmt):
+    pil_format, mime_type, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue(), mime_type
+
+
+def variants(data):
+    """((width, height), [(extension, mime type, width, bytes), ...]) for an image, or None if Pillow cannot read it"""
+    from PIL import Image, ImageOps
+
+    try:
+        source = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        source = source.convert('RGBA' if 'A' in source.getbands() or 'transparency' in source.info else 'RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    widths = [width for width in WIDTHS if width < source.width]
+    if source.width <= WIDTHS[-1]:
+        widths.append(source.width)
+    output = []
+    for width in widths:
+        image = source.resize((width, round(source.height * width / source.width)), Image.LANCZOS)
+        for fmt in _formats(source):
+            encoded, mime_type = _encode(image, fmt)
+            output.append((fmt, mime_type, width, encoded))
+    return source.size, output
+
+
+def icon(data):
+    """A multi-size .ico made from any image Pillow can read, or None"""
+    from PIL import Image, ImageOps
+
+    try:
+        source = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('RGBA')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    largest = ICON_SIZES[-1]
+    square = ImageOps.fit(source, largest, Image.LANCZOS)
+    buffer = io.BytesIO()
+    square.save(buffer, 'ICO', sizes=ICON_SIZES)
+    return buffer.getvalue()
@@ -0,0 +1,59 @@
+"""
+Poster frame and a smaller rendition of the hero video, made by build_assets.py.
+
+Videos in static/videos are fingerprinted like the other static files,
+so the static view serves them with an immutable Cache-Control, a stable
+ETag and Range/206 responses for seeking. When ffmpeg is on the PATH the
+build also extracts a poster frame (shown until the video is attached,
+see static/js/hero.js) and encodes a rendition at most SMALL_WIDTH wide
+with a capped bitrate for phones. Without ffmpeg the hero plays the original file.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+
+POSTER_WIDTH = 760  # Twice the hero's 380px layout width
+POSTER_AT = 1.0  # Seconds into the video
+SMALL_WIDTH = 360
+SMALL_MAXRATE = '400k'
+VIDEO_EXTENSIONS = ('.mp4', '.webm')
+
+
+def available():
+    return shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+
+def _run(*args):
+    return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+
+
+def size(path):
+    """(width, height) of the first video stream"""
+    output = _run('ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                  '-show_entries', 'stream=width,height', '-of', 'csv=p=0', path)
+    width, height = output.strip().split(',')[:2]
+    return int(width), int(height)
+
+
+def _encode(path, suffix, input_options, output_options):
+    """Run ffmpeg on path and return the output file's bytes"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, f'output{suffix}')
+        _run('ffmpeg', '-v', 'error', '-y', *input_options, '-i', path, *output_options, output)
+        with open(output, 'rb') as f:
+            return f.read()
+
+
+def poster(path, width=POSTER_WIDTH):
+    """A JPEG frame from the video, scaled down to width"""
+    return _encode(path, '.jpg', ['-ss', str(POSTER_AT)],
+                   ['-frames:v', '1', '-vf', f"scale='min({width},iw)':-2", '-q:v', '4'])
+
+
+def rendition(path, width=SMALL_WIDTH):
+    """The video re-encoded at width and a capped bitrate, without audio, ready to stream (faststart)"""
+    return _encode(path, '.mp4', [],
+                   ['-vf', f"scale='min({width},iw)':-2", '-c:v', 'libx264', '-preset', 'slow',
+                    '-crf', '30', '-maxrate', SMALL_MAXRATE, '-bufsize', '800k',
+                    '-pix_fmt', 'yuv420p', '-an', '-movflags', '+faststart'])
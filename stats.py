@@ -0,0 +1,157 @@
+"""
+Incrementally maintained dashboard statistics.
+
+Every insert that the dashboard reports on calls ``increment()`` in the
+same transaction, which bumps a handful of StatCounter rows with an
+atomic upsert. The dashboard then reads a few pre-aggregated rows instead
+of counting whole tables.
+
+Each counter is split over SHARDS rows and an increment bumps a random
+one, so concurrent registrations rarely wait for each other's row locks
+(held until commit) on the grand totals every signup touches. Readers
+sum the shards. Until migration 9 drops the old (metric, key, period)
+unique key, which the previous release upserts on, everything goes to
+shard 0. ``rebuild()`` recomputes everything from the source tables (see
+rebuild_stats.py) for backfills or after bulk edits.
+
+Counts are of submissions received, so deleting a contact message or a
+program does not decrease them.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import (
+    db, StatCounter, User, Contact, Registration, ProgramRegistration, SessionRegistration,
+)
+
+# Metrics that also feed the combined daily 'signups' series
+SIGNUP_METRICS = ('program_registrations', 'session_registrations', 'registrations')
+
+SHARDS = 8
+UNSHARDED_KEY = ('metric', 'key', 'period')  # Unique key before migration 7
+
+_shard_counts = {}  # Engine -> shards in use, see _shards()
+
+
+def has_unsharded_key():
+    """Whether stat_counter still has its unique key from before the shard column"""
+    inspector = db.inspect(db.engine)
+    keys = [constraint['column_names'] for constraint in inspector.get_unique_constraints('stat_counter')]
+    keys += [index['column_names'] for index in inspector.get_indexes('stat_counter') if index['unique']]
+    return list(UNSHARDED_KEY) in keys
+
+
+def _shards():
+    """SHARDS, or 1 while the old unique key would reject a second shard of the same counter"""
+    engine = db.engine
+    if engine not in _shard_counts:
+        _shard_counts[engine] = 1 if has_unsharded_key() else SHARDS
+    return _shard_counts[engine]
+
+
+def _upsert(metric, key, period, amount, shard):
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Imported here so start-up does not load the dialect this deploy does not use
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(StatCounter).values(metric=metric, key=key, period=period, shard=shard, count=amount)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['metric', 'key', 'period', 'shard'],
+            set_={'count': StatCounter.count + amount}
+        )
+        db.session.execute(stmt)
+        return
+
+    updated = StatCounter.query.filter_by(metric=metric, key=key, period=period, shard=shard).update(
+        {'count': StatCounter.count + amount}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(StatCounter(metric=metric, key=key, period=period, shard=shard, count=amount))
+
+
+def increment(metric, key='', when=None, amount=1):
+    """Count new records for metric in the current transaction (the caller commits)"""
+    day = (when or datetime.utcnow()).date().isoformat()
+    shard = random.randrange(_shards())
+    _upsert(metric, '', 'total', amount, shard)
+    _upsert(metric, '', day, amount, shard)
+    if key != '':
+        _upsert(metric, str(key), 'total', amount, shard)
+    if metric in SIGNUP_METRICS:
+        _upsert('signups', '', 'total', amount, shard)
+        _upsert('signups', '', day, amount, shard)
+
+
+def dashboard_stats(days=14):
+    """Return ({metric: total}, [(date, signups), ...] for the last `days` days) in one query"""
+    first_day = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = db.session.query(
+        StatCounter.metric, StatCounter.period, db.func.sum(StatCounter.count)
+    ).filter(
+        StatCounter.key == '',
+        db.or_(
+            StatCounter.period == 'total',
+            db.and_(StatCounter.metric == 'signups', StatCounter.period >= first_day.isoformat())
+        )
+    ).group_by(StatCounter.metric, StatCounter.period).all()
+
+    totals = defaultdict(int)
+    daily = {}
+    for metric, period, count in rows:
+        if period == 'total':
+            totals[metric] = count
+        else:
+            daily[period] = count
+
+    series = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        series.append((day, daily.get(day.isoformat(), 0)))
+    return totals, series
+
+
+def rebuild():
+    """Recompute every counter from the source tables (into shard 0)"""
+    StatCounter.query.delete()
+
+    counts = {}
+
+    def add(metric, key, period, amount):
+        counts[(metric, key, period)] = counts.get((metric, key, period), 0) + amount
+
+    sources = [
+        ('program_registrations', ProgramRegistration, ProgramRegistration.program_name),
+        ('session_registrations', SessionRegistration, SessionRegistration.session_id),
+        ('registrations', Registration, Registration.program_id),
+        ('contacts', Contact, None),
+        ('users', User, None),
+    ]
+    for metric, model, key_column in sources:
+        by_day = db.session.query(
+            db.func.date(model.created_at), db.func.count(model.id)
+        ).group_by(db.func.date(model.created_at)).all()
+        for day, amount in by_day:
+            add(metric, '', 'total', amount)
+            if metric in SIGNUP_METRICS:
+                add('signups', '', 'total', amount)
+            if day is None:
+                continue
+            day = str(day)[:10]
+            add(metric, '', day, amount)
+            if metric in SIGNUP_METRICS:
+                add('signups', '', day, amount)
+
+        if key_column is not None:
+            for key, amount in db.session.query(key_column, db.func.count(model.id)).group_by(key_column):
+                add(metric, str(key), 'total', amount)
+
+    db.session.add_all(
+        StatCounter(metric=metric, key=key, period=period, count=amount)
+        for (metric, key, period), amount in counts.items()
+    )
+    db.session.commit()
+    return len(counts)
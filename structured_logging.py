@@ -0,0 +1,148 @@
+"""
+Structured JSON logging that never blocks a request on I/O.
+
+configure_logging(app) sends every log record through a QueueHandler: the
+request thread only formats the record as one JSON line and puts it on an
+in-memory queue, and a QueueListener thread writes the lines to stdout (or
+LOG_FILE). Each line carries the request ID, which is taken from an
+incoming X-Request-ID header or generated, echoed back in the X-Request-ID
+response header, and shared with the request metrics access log.
+
+High-volume info logs pass ``extra={'sample': True}`` and are then kept
+with probability LOG_SAMPLE_RATE; warnings and errors are always kept.
+Other ``extra`` fields become JSON keys, so log values rather than
+formatting them into the message.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+from uuid import uuid4
+
+from flask import g, has_request_context, request
+
+# Attributes every LogRecord has, everything else came in through extra=
+_RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'sample'}
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def request_id():
+    """ID of the current request, or None outside of a request"""
+    if has_request_context():
+        return g.get('request_id')
+    return None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        rid = getattr(record, 'request_id', None)
+        if rid:
+            entry['request_id'] = rid
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry and key != 'request_id':
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single-line format for local development (LOG_FORMAT=text)"""
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = ' '.join(f'{k}={v}' for k, v in record.__dict__.items() if k not in _RECORD_ATTRIBUTES and v is not None)
+        if fields:
+            # Keep the fields on the first line, above any traceback
+            first, newline, rest = line.partition('\n')
+            line = f'{first} {fields}{newline}{rest}'
+        return line
+
+
+class ContextFilter(logging.Filter):
+    """Attach the request ID and drop unsampled high-volume records (runs in the calling thread)"""
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if getattr(record, 'sample', False) and record.levelno < logging.WARNING:
+            if random.random() >= self.sample_rate:
+                return False
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id()
+        return True
+
+
+_listener = None
+
+
+def _start_listener(log_queue=None, handler=None):
+    """(Re)start the thread that writes queued records, reusing the last queue/handler by default"""
+    global _listener
+    if _listener is not None:
+        log_queue = _listener.queue if log_queue is None else log_queue
+        handler = _listener.handlers[0] if handler is None else handler
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging(app):
+    """Route all logging through a queue to a JSON (or text) handler and tag requests with IDs"""
+    level = app.config.get('LOG_LEVEL', 'INFO')
+    formatter = TextFormatter() if app.config.get('LOG_FORMAT', 'json') == 'text' else JsonFormatter()
+
+    log_file = app.config.get('LOG_FILE')
+    output = logging.FileHandler(log_file) if log_file else logging.StreamHandler(sys.stdout)
+    # Records arrive already formatted by the QueueHandler
+    output.setFormatter(logging.Formatter('%(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(formatter)
+    queue_handler.addFilter(ContextFilter(app.config.get('LOG_SAMPLE_RATE', 1.0)))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    if _listener is None:
+        atexit.register(_stop_listener)
+        # The listener thread does not survive fork(), e.g. gunicorn --preload
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_start_listener)
+    else:
+        _stop_listener()
+    _start_listener(log_queue, output)
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        if g.get('request_id'):
+            response.headers['X-Request-ID'] = g.request_id
+        return response
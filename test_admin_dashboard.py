@@ -0,0 +1,70 @@
+"""Check that the admin dashboard issues the same number of queries however much data exists"""
+import os
+import tempfile
+from datetime import date
+
+from sqlalchemy import event
+
+from app import create_app
+from models import db, User, Program, Contact, Registration, ProgramRegistration, SessionRegistration
+import migrations
+
+# Always a throwaway database, whatever DATABASE_URL points at
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_dashboard.db')})
+
+with app.app_context():
+    migrations.upgrade()
+
+
+def seed(n):
+    """Add n users each registered for their own program, plus n of every other record"""
+    with app.app_context():
+        start = User.query.count()
+        for i in range(start, start + n):
+            user = User(name=f'User {i}', email=f'user{i}@example.com')
+            program = Program(name=f'Program {i}', type='online', date=date(2026, 1, 1))
+            db.session.add_all([user, program])
+            db.session.flush()
+            db.session.add_all([
+                Registration(user_id=user.id, program_id=program.id),
+                ProgramRegistration(program_name=program.name, full_name=user.name, email=user.email, phone='1'),
+                SessionRegistration(session_id=program.id, session_name=program.name, name=user.name, email=user.email, phone='1'),
+                Contact(name=user.name, email=user.email, message='Hello'),
+            ])
+        db.session.commit()
+
+
+def count_dashboard_queries(client):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/admin/dashboard')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_dashboard_query_count_is_constant():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True
+
+    seed(2)
+    small = count_dashboard_queries(client)
+    seed(25)
+    large = count_dashboard_queries(client)
+
+    assert large == small, f'dashboard ran {small} queries with little data but {large} with more'
+    assert small <= 7, f'dashboard ran {small} queries'
+
+
+if __name__ == '__main__':
+    test_dashboard_query_count_is_constant()
+    print('Dashboard query count OK')
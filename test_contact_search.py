@@ -0,0 +1,106 @@
+"""Check that the contact full-text index follows the contact table and that admin search uses it"""
+import os
+import tempfile
+
+from app import create_app
+from models import db, Contact
+import contact_search
+import migrations
+
+# Always a throwaway database, whatever DATABASE_URL points at
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_contact_search.db')})
+
+with app.app_context():
+    migrations.upgrade()
+
+
+def indexed(word):
+    """Ids of the contacts whose contact_fts row matches word"""
+    rows = db.session.execute(db.text("SELECT rowid FROM contact_fts WHERE contact_fts MATCH :word"),
+                              {'word': f'"{word}"'})
+    return {row.rowid for row in rows}
+
+
+def admin_client():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True
+    return client
+
+
+def test_index_follows_inserts_updates_and_deletes():
+    with app.app_context():
+        contact = Contact(name='Tara Devi', email='tara@example.com', message='Is the silent retreat full?')
+        db.session.add(contact)
+        db.session.commit()
+        assert indexed('retreat') == {contact.id}
+
+        contact.message = 'Which weekend classes are open?'
+        db.session.commit()
+        assert indexed('retreat') == set()
+        assert indexed('weekend') == {contact.id}
+
+        db.session.delete(contact)
+        db.session.commit()
+        assert indexed('weekend') == set()
+        assert indexed('tara') == set()
+
+
+def test_search_matches_part_of_an_email():
+    with app.app_context():
+        db.session.add_all([
+            Contact(name='Jane Doe', email='jane.doe@lotus-mail.org', message='Hello'),
+            Contact(name='Arjun', email='arjun@example.com', message='Do you have parking?'),
+        ])
+        db.session.commit()
+
+    response = admin_client().get('/admin/contacts', query_string={'search': 'lotus'})
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert 'Jane Doe' in html
+    assert 'Arjun' not in html
+
+
+def test_search_ranks_and_marks_matches_without_folding_accents():
+    with app.app_context():
+        db.session.add_all([
+            Contact(name='Maya', email='maya@example.com', message='Is there a meditation for <b>beginners</b>?'),
+            Contact(name='Meditation Circle', email='circle@example.com', message='Hello'),
+            Contact(name='José Ramos', email='jr@example.com', message='Hola'),
+        ])
+        db.session.commit()
+
+    client = admin_client()
+    html = client.get('/admin/contacts', query_string={'search': 'medit'}).get_data(as_text=True)
+    # A name match ranks above a message match, and message text stays escaped
+    assert html.index('<mark>Meditation</mark> Circle') < html.index('<mark>meditation</mark> for &lt;b&gt;')
+
+    assert '<mark>José</mark> Ramos' in client.get('/admin/contacts', query_string={'search': 'josé'}).get_data(as_text=True)
+    assert 'José Ramos' not in client.get('/admin/contacts', query_string={'search': 'jose'}).get_data(as_text=True)
+
+
+def test_search_pages_with_an_offset():
+    with app.app_context():
+        db.session.add_all(Contact(name=f'Guest {n}', email=f'guest{n}@yoga-pages.net', message='Hi') for n in range(5))
+        db.session.commit()
+
+    with app.test_request_context('/admin/contacts?search=pages'):
+        first = contact_search.search('pages', per_page=3)
+    assert len(first.items) == 3 and first.is_first
+    assert 'offset=3' in first.next_url
+
+    with app.test_request_context('/admin/contacts?search=pages&offset=3'):
+        second = contact_search.search('pages', per_page=3)
+    assert len(second.items) == 2 and second.next_url is None
+    seen = [contact.id for contact, name, snippet in first.items + second.items]
+    assert len(set(seen)) == 5
+
+
+def test_snippet_keeps_a_match_with_no_space_before_it():
+    url = 'https://example.org/' + 'a1b2' * 40 + '/sangha-weekend'
+    with app.app_context():
+        db.session.add(Contact(name='Lin', email='lin@example.com', message=f'Link: {url} thanks'))
+        db.session.commit()
+
+    html = admin_client().get('/admin/contacts', query_string={'search': 'sangha'}).get_data(as_text=True)
+    assert '<mark>sangha</mark>-weekend' in html
@@ -0,0 +1,146 @@
+"""Deliver queued email through a local debugging SMTP server and check the outbox status transitions"""
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from models import db, OutboxEmail
+import mail_outbox
+import migrations
+
+
+class DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages, refusing any recipient at bounce.example.com"""
+    def handle(self):
+        self.wfile.write(b'220 test ESMTP\r\n')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'RCPT' and b'@bounce.example.com' in line:
+                self.wfile.write(b'550 no such mailbox\r\n')
+            elif command == b'DATA':
+                self.wfile.write(b'354 go ahead\r\n')
+                data = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(line)
+                self.server.received.append(b''.join(data))
+                self.wfile.write(b'250 queued\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 ok\r\n')
+
+
+class SMTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    received = []
+
+
+smtp_server = SMTPServer(('127.0.0.1', 0), DebuggingSMTPHandler)
+threading.Thread(target=smtp_server.serve_forever, daemon=True).start()
+
+# A port nothing listens on, for an SMTP outage
+with socket.socket() as closed:
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+
+
+def make_app(port, worker='external'):
+    """An app with its own throwaway database, sending to 127.0.0.1:port"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test_outbox.db'),
+        'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': port, 'MAIL_USE_TLS': False, 'MAIL_USE_SSL': False,
+        'MAIL_USERNAME': '', 'MAIL_PASSWORD': '', 'MAIL_DEFAULT_SENDER': 'center@example.com',
+        'MAIL_OUTBOX_WORKER': worker,
+    })
+    with app.app_context():
+        migrations.upgrade()
+    return app
+
+
+app = make_app(smtp_server.server_address[1])
+outbox = app.extensions['mail_outbox']
+
+
+def queue(app, *recipients):
+    app_outbox = app.extensions['mail_outbox']
+    return app_outbox.send(app_outbox.message(subject='Welcome', recipients=list(recipients), body='See you soon')).id
+
+
+def test_process_batch_sends_over_smtp():
+    with app.app_context():
+        first, second = queue(app, 'asha@example.com'), queue(app, 'ravi@example.com')
+        received = len(smtp_server.received)
+
+        assert outbox.process_batch() == 2
+        assert len(smtp_server.received) == received + 2
+        for email in (db.session.get(OutboxEmail, first), db.session.get(OutboxEmail, second)):
+            assert (email.status, email.attempts, email.claim_token) == ('sent', 1, None)
+            assert email.sent_at is not None
+        assert outbox.process_batch() == 0
+
+
+def test_refused_message_backs_off_then_fails():
+    with app.app_context():
+        bounced, delivered = queue(app, 'nobody@bounce.example.com'), queue(app, 'meera@example.com')
+
+        # One refused recipient does not hold back the rest of the batch
+        assert outbox.process_batch() == 1
+        assert db.session.get(OutboxEmail, delivered).status == 'sent'
+
+        for attempt in range(1, mail_outbox.MAX_ATTEMPTS):
+            email = db.session.get(OutboxEmail, bounced)
+            assert (email.status, email.attempts) == ('pending', attempt)
+            assert '550' in email.last_error
+            delay = (email.next_attempt_at - datetime.utcnow()).total_seconds()
+            expected = mail_outbox.RETRY_BASE_DELAY * 2 ** (attempt - 1)
+            assert expected - 5 < delay <= expected
+
+            # Not due yet, so the next batch leaves it alone
+            assert outbox.process_batch() == 0
+            assert db.session.get(OutboxEmail, bounced).attempts == attempt
+
+            email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+            outbox.process_batch()
+
+        email = db.session.get(OutboxEmail, bounced)
+        assert (email.status, email.attempts) == ('failed', mail_outbox.MAX_ATTEMPTS)
+        email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        assert outbox.process_batch() == 0
+        assert db.session.get(OutboxEmail, bounced).attempts == mail_outbox.MAX_ATTEMPTS
+
+
+def test_smtp_outage_keeps_the_batch_for_a_retry():
+    down_app = make_app(closed_port)
+    with down_app.app_context():
+        ids = [queue(down_app, 'asha@example.com'), queue(down_app, 'ravi@example.com')]
+
+        assert down_app.extensions['mail_outbox'].process_batch() == 0
+        for email in OutboxEmail.query.filter(OutboxEmail.id.in_(ids)):
+            assert (email.status, email.attempts, email.claim_token) == ('pending', 1, None)
+            assert email.next_attempt_at > datetime.utcnow()
+
+
+def test_started_dispatcher_sends_email_queued_before_the_restart():
+    thread_app = make_app(smtp_server.server_address[1], worker='thread')
+    with thread_app.app_context():
+        db.session.add(OutboxEmail(subject='Left over', recipients='asha@example.com', sender='center@example.com', body='Hi'))
+        db.session.commit()
+
+    thread_app.extensions['mail_outbox'].start()
+    deadline = time.time() + 10
+    with thread_app.app_context():
+        while OutboxEmail.query.filter_by(status='sent').count() == 0:
+            assert time.time() < deadline, "queued email was not delivered"
+            time.sleep(0.1)
+            db.session.rollback()
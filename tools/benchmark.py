@@ -0,0 +1,373 @@
+"""
+Benchmark the public, image, registration and admin routes.
+
+Usage:
+    python tools/benchmark.py                          # seed a temp SQLite database, run both modes
+    python tools/benchmark.py --mode client            # Flask test client only (in-process)
+    python tools/benchmark.py --mode gunicorn --workers 4 --concurrency 16
+    python tools/benchmark.py --programs 200 --users 20000 --registrations 100000
+    python tools/benchmark.py --json results.json      # save results
+    python tools/benchmark.py --compare results.json   # exit 1 if p95 or throughput regressed
+    python tools/benchmark.py --mode gunicorn --worker-classes sync,gthread --only admin-reply,program-image
+
+Each scenario is run --requests times from --concurrency threads after a
+short warm-up, and reports p50/p95/p99 latency, throughput and errors.
+'client' mode measures the app alone through the Flask test client;
+'gunicorn' mode starts a real gunicorn on a free local port and drives it
+over HTTP with the settings in gunicorn.conf.py; --worker-classes runs it
+once per worker class to compare them (e.g. the old sync workers against
+gthread). Peak RSS is the benchmark process in client mode and the sum of
+the gunicorn master and workers in gunicorn mode (Linux only).
+
+By default the data lives in a throwaway SQLite file. --use-database-url
+benchmarks DATABASE_URL instead and, unless --no-seed is given, adds the
+synthetic rows to it. Emails, admin replies included, are only queued in
+the outbox, never sent.
+"""
+import argparse
+import http.client
+import json
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+parser = argparse.ArgumentParser(description='Benchmark the public, image, registration and admin routes')
+parser.add_argument('--mode', choices=['client', 'gunicorn', 'both'], default='both')
+parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+parser.add_argument('--concurrency', type=int, default=8)
+parser.add_argument('--warmup', type=int, default=5)
+parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+parser.add_argument('--gunicorn-args', default='', help='extra gunicorn arguments')
+parser.add_argument('--worker-classes', help='comma-separated gunicorn worker classes to compare, e.g. sync,gthread')
+parser.add_argument('--threads', type=int, help='threads per gthread worker (default from gunicorn.conf.py)')
+parser.add_argument('--programs', type=int, default=50)
+parser.add_argument('--users', type=int, default=1000)
+parser.add_argument('--registrations', type=int, default=5000)
+parser.add_argument('--contacts', type=int, default=500)
+parser.add_argument('--no-page-cache', action='store_true', help='disable the rendered page cache')
+parser.add_argument('--use-database-url', action='store_true')
+parser.add_argument('--no-seed', action='store_true')
+parser.add_argument('--only', help='comma-separated scenario names to run')
+parser.add_argument('--json', help='write results to this file')
+parser.add_argument('--compare', help='baseline results file to compare against')
+parser.add_argument('--threshold', type=float, default=0.25, help='allowed regression (0.25 = 25%%)')
+args = parser.parse_args()
+
+if not args.use_database_url:
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+os.environ['MAIL_OUTBOX_WORKER'] = 'external'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['SECRET_KEY'] = os.environ.get('BENCHMARK_SECRET_KEY', 'benchmark-secret-key')
+if args.no_page_cache:
+    os.environ['PAGE_CACHE_ENABLED'] = 'false'
+
+from app import app  # noqa: E402
+from models import db, Program, Contact  # noqa: E402
+from seed_data import seed  # noqa: E402
+import migrations  # noqa: E402
+
+
+class Scenario:
+    def __init__(self, name, path, method='GET', form=None, admin=False):
+        self.name = name
+        self.path = path  # str or callable(i) -> str
+        self.method = method
+        self.form = form  # callable(i) -> dict for POSTs
+        self.admin = admin
+
+    def request(self, i):
+        path = self.path(i) if callable(self.path) else self.path
+        return path, (self.form(i) if self.form else None)
+
+
+def scenarios():
+    with app.app_context():
+        programs = Program.query.order_by(Program.id).all()
+        imaged = [p.id for p in programs if p.has_image()] or [0]
+        session_program = next((p for p in programs if p.status == 'active'), None)
+        contact_id = db.session.query(db.func.min(Contact.id)).scalar()
+
+    all_scenarios = [
+        Scenario('home', '/'),
+        Scenario('programs', '/programs'),
+        Scenario('program-image', lambda i: f'/program-image/{imaged[i % len(imaged)]}?size=card'),
+        Scenario('program-image-full', lambda i: f'/program-image/{imaged[i % len(imaged)]}'),
+        Scenario('admin-dashboard', '/admin/dashboard', admin=True),
+        Scenario('admin-users', '/admin/users', admin=True),
+        Scenario('admin-contacts', '/admin/contacts', admin=True),
+        Scenario('admin-session-registrations', '/admin/session-registrations', admin=True),
+    ]
+    if session_program:
+        all_scenarios.append(Scenario(
+            'register-session', '/register_session_modal', method='POST',
+            form=lambda i: {'session_id': session_program.id, 'session_name': session_program.name,
+                            'name': f'Bench {i}', 'email': f'bench-{i}@example.com', 'phone': '9999999999'}))
+    if contact_id:
+        all_scenarios.append(Scenario(
+            'admin-reply', f'/admin/contacts/{contact_id}/reply', method='POST', admin=True,
+            form=lambda i: {'email': f'visitor-{i}@example.com', 'subject': 'Re: your question',
+                            'message': 'Thank you for writing to us.'}))
+    if args.only:
+        wanted = set(args.only.split(','))
+        all_scenarios = [s for s in all_scenarios if s.name in wanted]
+    return all_scenarios
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(scenario, send):
+    """Run one scenario with send(scenario, i) -> status code and return its result dict"""
+    for i in range(args.warmup):
+        send(scenario, -1 - i)
+
+    def timed(i):
+        started = time.perf_counter()
+        try:
+            status = send(scenario, i)
+        except Exception:
+            status = 0
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(timed, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status in results if not 200 <= status < 400),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'throughput_rps': len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def admin_cookie():
+    """A signed admin session cookie, valid for any process sharing SECRET_KEY"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['is_admin'] = True
+        sess['admin_id'] = 1
+    return client.get_cookie('session').value
+
+
+def run_client():
+    local = threading.local()
+    cookie = admin_cookie()
+
+    def send(scenario, i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        client = local.client
+        if scenario.admin:
+            client.set_cookie('session', cookie)
+        else:
+            client.delete_cookie('session')
+        path, form = scenario.request(i)
+        response = client.open(path, method=scenario.method, data=form)
+        response.close()
+        return response.status_code
+
+    results = {}
+    for scenario in scenarios():
+        results[scenario.name] = run_scenario(scenario, send)
+        print_result('client', scenario.name, results[scenario.name])
+    return results, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def process_tree_rss(root_pid):
+    """Total resident memory in bytes of root_pid and its children (Linux /proc)"""
+    pids = {root_pid}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == root_pid:
+                pids.add(int(entry))
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(worker_class=None):
+    port = free_port()
+    mode = f'gunicorn-{worker_class}' if worker_class else 'gunicorn'
+    # gunicorn.conf.py in ROOT supplies the rest of the settings
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+               '--log-level', 'warning'] + args.gunicorn_args.split() + ['app:app']
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers))
+    if worker_class:
+        env['GUNICORN_WORKER_CLASS'] = worker_class
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/about')
+                conn.getresponse().read()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise SystemExit('gunicorn did not start')
+                time.sleep(0.2)
+
+        peak_rss = 0
+        sampling = threading.Event()
+
+        def sample():
+            nonlocal peak_rss
+            while not sampling.is_set():
+                peak_rss = max(peak_rss, process_tree_rss(server.pid))
+                sampling.wait(0.2)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        if os.path.isdir('/proc'):
+            sampler.start()
+
+        cookie = f'session={admin_cookie()}'
+        local = threading.local()
+
+        def send(scenario, i):
+            if not hasattr(local, 'conn'):
+                local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            path, form = scenario.request(i)
+            headers = {'Cookie': cookie} if scenario.admin else {}
+            body = None
+            if form is not None:
+                body = urlencode(form)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            try:
+                local.conn.request(scenario.method, path, body=body, headers=headers)
+                response = local.conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                local.conn.close()
+                raise
+            return response.status
+
+        results = {}
+        for scenario in scenarios():
+            results[scenario.name] = run_scenario(scenario, send)
+            print_result(mode, scenario.name, results[scenario.name])
+        sampling.set()
+        return results, peak_rss or None
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def print_result(mode, name, result):
+    print(f"{mode:<16} {name:<28} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+          f"{result['throughput_rps']:>9.1f} {result['errors']:>6}")
+
+
+def compare(results, baseline):
+    """Return a list of regressions against a baseline results file"""
+    regressions = []
+    for mode, mode_results in results['modes'].items():
+        for name, result in mode_results['scenarios'].items():
+            before = baseline.get('modes', {}).get(mode, {}).get('scenarios', {}).get(name)
+            if not before:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + args.threshold):
+                regressions.append(f"{mode} {name}: p95 {before['p95_ms']:.1f}ms -> {result['p95_ms']:.1f}ms")
+            if result['throughput_rps'] < before['throughput_rps'] * (1 - args.threshold):
+                regressions.append(f"{mode} {name}: throughput {before['throughput_rps']:.1f} -> "
+                                   f"{result['throughput_rps']:.1f} req/s")
+            if result['errors'] > before['errors']:
+                regressions.append(f"{mode} {name}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def main():
+    with app.app_context():
+        migrations.upgrade()
+    if not args.no_seed:
+        with app.app_context():
+            seed(args.programs, args.users, args.registrations, args.contacts)
+
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {key: getattr(args, key) for key in (
+            'requests', 'concurrency', 'workers', 'threads', 'worker_classes',
+            'programs', 'users', 'registrations', 'no_page_cache')},
+        'modes': {},
+    }
+    print(f"\n{'mode':<16} {'scenario':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'errors':>6}")
+    runs = []
+    if args.mode in ('client', 'both'):
+        runs.append(('client', run_client))
+    if args.mode in ('gunicorn', 'both'):
+        if args.worker_classes:
+            runs += [(f'gunicorn-{worker_class}', lambda worker_class=worker_class: run_gunicorn(worker_class))
+                     for worker_class in args.worker_classes.split(',')]
+        else:
+            runs.append(('gunicorn', run_gunicorn))
+    for mode, runner in runs:
+        scenario_results, peak_rss = runner()
+        results['modes'][mode] = {'scenarios': scenario_results, 'peak_rss_bytes': peak_rss}
+
+    print()
+    for mode, mode_results in results['modes'].items():
+        rss = mode_results['peak_rss_bytes']
+        print(f"{mode} peak RSS: {rss / 1024 / 1024:.1f} MiB" if rss else f"{mode} peak RSS: n/a")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Fire many concurrent bookings at one program and check that capacity holds.
+
+Usage:
+    python tools/booking_load.py                       # 300 bookings for 50 seats on a temp SQLite file
+    python tools/booking_load.py --bookings 600 --capacity 120 --threads 64
+    python tools/booking_load.py --use-database-url    # run against DATABASE_URL (e.g. PostgreSQL)
+
+Half of the bookings come through the homepage session modal and half
+through logged-in account registrations, and every account also sends a
+duplicate registration at the same time. Afterwards exactly `capacity`
+bookings must be confirmed, the rest waitlisted, Program.seats_taken must
+match, and no user may hold two registrations for the program.
+
+--use-database-url creates a throwaway program and users in that database.
+Outgoing emails are only queued in the outbox, never sent.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from uuid import uuid4
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument('--bookings', type=int, default=300)
+parser.add_argument('--capacity', type=int, default=50)
+parser.add_argument('--threads', type=int, default=32)
+parser.add_argument('--use-database-url', action='store_true')
+args = parser.parse_args()
+
+if not args.use_database_url:
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'booking_load.db')}"
+os.environ['MAIL_OUTBOX_WORKER'] = 'external'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('SECRET_KEY', 'booking-load-test')
+
+from app import app  # noqa: E402
+from models import db, User, Program, Registration, SessionRegistration  # noqa: E402
+import migrations  # noqa: E402
+
+
+def setup(accounts):
+    run = uuid4().hex[:8]
+    with app.app_context():
+        migrations.upgrade()
+        program = Program(name=f'Load test retreat {run}', type='offline', date=date.today(),
+                          status='active', capacity=args.capacity)
+        db.session.add(program)
+        users = [User(name=f'Load {run} {i}', email=f'load-{run}-{i}@example.com') for i in range(accounts)]
+        db.session.add_all(users)
+        db.session.commit()
+        return program.id, program.name, [user.id for user in users]
+
+
+def main():
+    accounts = args.bookings // 2
+    program_id, program_name, user_ids = setup(accounts)
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    def book_session(i):
+        return client().post('/register_session_modal', data={
+            'session_id': program_id, 'session_name': program_name,
+            'name': f'Guest {i}', 'email': f'guest-{i}@example.com', 'phone': '9999999999',
+        }).status_code
+
+    def book_account(user_id):
+        c = client()
+        with c.session_transaction() as sess:
+            sess['user_id'] = user_id
+        return c.post(f'/register/{program_id}').status_code
+
+    jobs = [(book_session, i) for i in range(args.bookings - accounts)]
+    jobs += [(book_account, user_id) for user_id in user_ids]
+    jobs += [(book_account, user_id) for user_id in user_ids]  # Duplicate attempts
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        codes = Counter(pool.map(lambda job: job[0](job[1]), jobs))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        program = db.session.get(Program, program_id)
+        statuses = Counter(s for (s,) in db.session.query(SessionRegistration.status).filter_by(session_id=program_id))
+        statuses.update(s for (s,) in db.session.query(Registration.status).filter_by(program_id=program_id))
+        duplicates = db.session.query(Registration.user_id).filter_by(program_id=program_id).group_by(
+            Registration.user_id).having(db.func.count(Registration.id) > 1).count()
+
+    print(f"{len(jobs)} requests ({args.bookings} bookings + {accounts} duplicates) on {args.threads} threads "
+          f"in {elapsed:.2f}s ({len(jobs) / elapsed:.0f} req/s)")
+    print(f"HTTP status codes: {dict(sorted(codes.items()))}")
+    print(f"Bookings: {dict(statuses)}, seats_taken={program.seats_taken}, capacity={program.capacity}")
+
+    expected_confirmed = min(args.capacity, args.bookings)
+    problems = []
+    if statuses['confirmed'] != expected_confirmed:
+        problems.append(f"expected {expected_confirmed} confirmed, got {statuses['confirmed']}")
+    if program.seats_taken != statuses['confirmed']:
+        problems.append(f"seats_taken {program.seats_taken} != confirmed {statuses['confirmed']}")
+    if sum(statuses.values()) != args.bookings:
+        problems.append(f"expected {args.bookings} bookings, got {sum(statuses.values())}")
+    if duplicates:
+        problems.append(f"{duplicates} users registered twice")
+    if codes.get(500):
+        problems.append(f"{codes[500]} requests failed with 500")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: capacity held under concurrent bookings")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
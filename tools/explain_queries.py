@@ -0,0 +1,101 @@
+"""
+Print the database query plan for the queries behind each route.
+
+Usage:
+    python tools/explain_queries.py            # plans against DATABASE_URL
+    python tools/explain_queries.py --analyze  # refresh planner statistics first
+
+Works with SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN). Plans that
+read a whole table instead of an index are flagged so they can be fixed
+before the registration tables grow large. PostgreSQL prefers sequential
+scans on tiny tables, so run it against a database with realistic data.
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import app  # noqa: E402
+from models import (  # noqa: E402
+    db, User, Program, ProgramImage, Contact, Registration,
+    ProgramRegistration, SessionRegistration, BlogPost, OutboxEmail,
+)
+
+
+def keyset(query, model):
+    """A later page of pagination.keyset_paginate() for query"""
+    cursor = (datetime.utcnow(), 1000)
+    return query.filter(db.tuple_(model.created_at, model.id) < cursor).order_by(
+        model.created_at.desc(), model.id.desc()).limit(51)
+
+
+def route_queries():
+    """(route, description, query) for every query a route runs against a growing table"""
+    now = datetime.utcnow()
+    return [
+        ('/', 'active programs', Program.query.filter_by(status='active').order_by(Program.date.desc())),
+        ('/programs', 'active programs', Program.query.filter_by(status='active').order_by(Program.date.desc())),
+        ('/blog', 'posts', BlogPost.query.order_by(BlogPost.created_at.desc())),
+        ('/program-image/<id>', 'image variant', ProgramImage.query.filter_by(program_id=1, variant='card', format='webp')),
+        ('/register/<id>', 'existing registration', Registration.query.filter_by(user_id=1, program_id=1)),
+        ('/admin/dashboard', 'latest contacts', Contact.query.order_by(Contact.created_at.desc()).limit(10)),
+        ('/admin/dashboard', 'latest registrations', Registration.query.order_by(Registration.created_at.desc()).limit(10)),
+        ('/admin/dashboard', 'latest program registrations', ProgramRegistration.query.order_by(ProgramRegistration.created_at.desc()).limit(10)),
+        ('/admin/dashboard', 'latest session registrations', SessionRegistration.query.order_by(SessionRegistration.created_at.desc()).limit(10)),
+        ('/admin/programs', 'all programs', Program.query.order_by(Program.created_at.desc())),
+        ('/admin/users', 'users page', keyset(User.query, User)),
+        ('/admin/contacts', 'contacts page', keyset(Contact.query, Contact)),
+        ('/admin/program-registrations', 'counts per program', db.session.query(
+            ProgramRegistration.program_name, db.func.count(ProgramRegistration.id), db.func.max(ProgramRegistration.created_at)
+        ).group_by(ProgramRegistration.program_name)),
+        ('/admin/program-registrations', 'one program page', keyset(ProgramRegistration.query.filter_by(program_name='x'), ProgramRegistration)),
+        ('/admin/session-registrations', 'counts per session', db.session.query(
+            SessionRegistration.session_id, db.func.count(SessionRegistration.id), db.func.max(SessionRegistration.created_at)
+        ).group_by(SessionRegistration.session_id)),
+        ('/admin/session-registrations', 'one session page', keyset(SessionRegistration.query.filter_by(session_id=1), SessionRegistration)),
+        ('(mail outbox)', 'due email', OutboxEmail.query.filter(OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now).order_by(OutboxEmail.id)),
+    ]
+
+
+def explain(query):
+    """Return the plan lines for an ORM query on the current database"""
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(dialect=dialect)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    connection = db.session.connection()
+    if dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN ' + str(compiled), params).fetchall()
+    return [row[0] for row in rows]
+
+
+def is_full_scan(line):
+    if line.startswith('SCAN ') and 'INDEX' not in line:
+        return True  # SQLite table scan
+    return 'Seq Scan' in line  # PostgreSQL sequential scan
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f"Query plans for {db.engine.url.render_as_string(hide_password=True)}\n")
+        if '--analyze' in sys.argv:
+            db.session.execute(db.text('ANALYZE'))
+
+        flagged = 0
+        for route, description, query in route_queries():
+            plan = explain(query)
+            full_scan = any(is_full_scan(line.strip()) for line in plan)
+            flagged += full_scan
+            print(f"{route} - {description}{'  <-- FULL SCAN' if full_scan else ''}")
+            for line in plan:
+                print(f"    {line}")
+            print()
+
+        print(f"{flagged} quer{'y' if flagged == 1 else 'ies'} with full table scans")
@@ -0,0 +1,114 @@
+"""
+Measure how long `import app` takes and check it against a budget.
+
+Usage:
+    python tools/import_budget.py                      # median of 5 cold imports, 800 ms budget
+    python tools/import_budget.py --budget-ms 700 --runs 9
+    python tools/import_budget.py --top 25             # show more of the slowest modules
+
+Every run imports the app in a fresh interpreter (so gunicorn workers,
+tests and the CLI scripts all pay this) with a throwaway SQLite URL, and
+the median wall time is compared to --budget-ms. It also fails if a
+module that is meant to load lazily shows up at import time: Pillow is
+only needed for photo uploads, Flask-Mail for sending email, and the
+PostgreSQL dialect only when DATABASE_URL points at PostgreSQL. The
+slowest modules from `python -X importtime` are listed to show where the
+time goes.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Modules that must not be imported by `import app`
+LAZY_MODULES = ('PIL', 'flask_mail', 'sqlalchemy.dialects.postgresql')
+
+MEASURE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({'ms': elapsed * 1000, 'modules': sorted(sys.modules)}))
+'''
+
+
+def run_import(env, importtime=False):
+    command = [sys.executable, '-W', 'ignore']
+    if importtime:
+        command += ['-X', 'importtime']
+    result = subprocess.run(command + ['-c', MEASURE], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest(importtime_output, top):
+    """(cumulative us, self us, module) for `app` and the modules it imports directly, slowest first"""
+    children = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = len(name) - len(name.lstrip())
+        row = (int(cumulative_us), int(self_us), name.strip())
+        # -X importtime prints children before their parent
+        if depth == 3:
+            children.append(row)
+        elif depth == 1:
+            if row[2] == 'app':
+                return [row] + sorted(children, reverse=True)[:top]
+            children = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the import time of the app against a budget')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 800)))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help='slowest modules to list')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import_budget.db')}"
+    env['LOG_LEVEL'] = 'WARNING'
+    env['MAIL_OUTBOX_WORKER'] = 'external'
+
+    # The first run also writes .pyc files, so it is not counted
+    run_import(env)
+    timings = []
+    for _ in range(args.runs):
+        result, _ = run_import(env)
+        timings.append(result['ms'])
+    median = statistics.median(timings)
+
+    result, importtime_output = run_import(env, importtime=True)
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in slowest(importtime_output, args.top):
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+    print()
+    print(f"import app: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(timings):.0f}, max {max(timings):.0f}), {len(result['modules'])} modules, "
+          f"budget {args.budget_ms:.0f} ms")
+
+    problems = []
+    if median > args.budget_ms:
+        problems.append(f"median import time {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for module in LAZY_MODULES:
+        if module in result['modules']:
+            problems.append(f"{module} is imported at start-up, it should be imported where it is used")
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print("OK: import time within budget")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
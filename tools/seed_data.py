@@ -0,0 +1,154 @@
+"""
+Fill the database with synthetic programs, users and registrations.
+
+Usage:
+    python tools/seed_data.py                                  # default scale into DATABASE_URL
+    python tools/seed_data.py --programs 200 --users 20000 --registrations 100000
+
+Every --image-every'th program gets a generated photo (with its resized
+variants), so image routes have something to serve. Rows are inserted in
+batches and the dashboard counters are rebuilt at the end. Used by
+tools/benchmark.py; only point it at a database you are happy to fill
+with fake data.
+"""
+import io
+import random
+import sys
+from datetime import datetime, timedelta, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+CATEGORIES = ['Child', 'Adult', 'Senior', 'Retreat', None]
+BATCH_SIZE = 1000
+
+
+def synthetic_photo(seed, width=1600, height=1200):
+    """A JPEG with a gradient, so every program gets different image bytes"""
+    from PIL import Image
+
+    rnd = random.Random(seed)
+    start = [rnd.randrange(256) for _ in range(3)]
+    end = [rnd.randrange(256) for _ in range(3)]
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', [
+        gradient.point(lambda v, a=a, b=b: a + (b - a) * v // 255) for a, b in zip(start, end)
+    ])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _insert(model, rows):
+    from models import db
+
+    for offset in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(db.insert(model), rows[offset:offset + BATCH_SIZE])
+    db.session.commit()
+
+
+def seed(programs=50, users=1000, registrations=5000, contacts=500, image_every=5, random_seed=0):
+    """Insert synthetic rows (call inside an app context) and return the new program ids"""
+    from app import set_program_photo
+    from models import db, User, Program, Contact, Registration, ProgramRegistration, SessionRegistration
+    import stats
+
+    rnd = random.Random(random_seed)
+    now = datetime.utcnow()
+    run = f'{now:%Y%m%d%H%M%S}-{rnd.randrange(10**6)}'
+
+    def when():
+        return now - timedelta(days=rnd.uniform(0, 90))
+
+    new_programs = []
+    for i in range(programs):
+        start = time(rnd.randrange(6, 20), rnd.choice([0, 30]))
+        end = time(start.hour + 1, start.minute)
+        program = Program(
+            name=f'Synthetic session {i + 1}', type=rnd.choice(['online', 'offline']),
+            time=f"{start.strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}",
+            date=(now + timedelta(days=rnd.randrange(-30, 60))).date(),
+            description='Guided meditation for benchmarking. ' * 8,
+            status='active' if rnd.random() < 0.8 else 'completed',
+            category=rnd.choice(CATEGORIES), start_time=start, end_time=end, created_at=when()
+        )
+        if image_every and i % image_every == 0:
+            set_program_photo(program, synthetic_photo(random_seed * 100003 + i), f'synthetic-{i}.jpg', 'image/jpeg')
+        db.session.add(program)
+        new_programs.append(program)
+    db.session.commit()
+    program_ids = [program.id for program in new_programs]
+    program_names = {program.id: program.name for program in new_programs}
+    print(f"Seeded {programs} programs")
+
+    _insert(User, [
+        {'name': f'Synthetic User {i}', 'email': f'user-{run}-{i}@example.com', 'phone': f'9{i:09d}'[:10],
+         'created_at': when()}
+        for i in range(users)
+    ])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.email.like(f'user-{run}-%'))]
+    print(f"Seeded {users} users")
+
+    # Split registrations between the three registration tables
+    per_kind = registrations // 3
+    pairs = set()
+    if user_ids and program_ids:
+        attempts = 0
+        while len(pairs) < min(per_kind, len(user_ids) * len(program_ids)) and attempts < per_kind * 5:
+            pairs.add((rnd.choice(user_ids), rnd.choice(program_ids)))
+            attempts += 1
+    _insert(Registration, [
+        {'user_id': user_id, 'program_id': program_id, 'status': 'confirmed', 'created_at': when()}
+        for user_id, program_id in pairs
+    ])
+    if program_ids:
+        _insert(SessionRegistration, [
+            {'session_id': program_id, 'session_name': program_names[program_id], 'name': f'Guest {i}',
+             'email': f'guest-{i}@example.com', 'phone': '9999999999', 'status': 'confirmed', 'created_at': when()}
+            for i, program_id in enumerate(rnd.choice(program_ids) for _ in range(per_kind))
+        ])
+        _insert(ProgramRegistration, [
+            {'program_name': program_names[rnd.choice(program_ids)], 'full_name': f'Visitor {i}',
+             'email': f'visitor-{i}@example.com', 'phone': '9999999999', 'created_at': when()}
+            for i in range(registrations - 2 * per_kind)
+        ])
+    _insert(Contact, [
+        {'name': f'Visitor {i}', 'email': f'visitor-{i}@example.com',
+         'message': rnd.choice(['When is the next retreat?', 'Do you have weekend classes?',
+                                'Can I bring my children?', 'Is parking available?']),
+         'created_at': when()}
+        for i in range(contacts)
+    ])
+    print(f"Seeded {registrations} registrations and {contacts} contacts")
+
+    db.session.execute(db.text("""
+        UPDATE program SET seats_taken =
+            (SELECT COUNT(*) FROM session_registration WHERE session_id = program.id) +
+            (SELECT COUNT(*) FROM registration WHERE program_id = program.id)
+    """))
+    db.session.commit()
+    stats.rebuild()
+    return program_ids
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Seed synthetic data into DATABASE_URL')
+    parser.add_argument('--programs', type=int, default=50)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--registrations', type=int, default=5000)
+    parser.add_argument('--contacts', type=int, default=500)
+    parser.add_argument('--image-every', type=int, default=5, help='give every Nth program a photo (0 for none)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+
+    from app import app
+    from models import db
+    import migrations
+
+    with app.app_context():
+        migrations.upgrade()
+        print(f"Seeding {db.engine.url.render_as_string(hide_password=True)}")
+        seed(args.programs, args.users, args.registrations, args.contacts, args.image_every, args.seed)